@@ -1,10 +1,12 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash
 import json
-from raid import get_raid_targets, parse_args, format_money, format_hours
+from raid import get_raid_targets, get_profile_targets, make_profiles, parse_args, format_money, format_hours
 import sys
 import os
 from dotenv import load_dotenv
 from config import DEBUG
+from jobs import JobManager
+from metrics import metrics
 
 # Load environment variables
 load_dotenv()
@@ -17,9 +19,68 @@ def index():
     """Render the main page with the form."""
     return render_template('index.html')
 
+# Scans from the web form run here instead of in the request thread
+jobs = JobManager()
+
+def scan_params(args):
+    """Scan parameters shown alongside the results."""
+    return {
+        'min_infra': args.min_infra,
+        'max_infra': args.max_infra,
+        'inactive_time': args.inactive_time,
+        'ignore_dnr': args.ignore_dnr,
+        'troop_ratio': args.troop_ratio,
+        'limit': args.limit,
+        'max_pages': args.max_pages
+    }
+
+def print_scan_summary(targets):
+    """Print summary and results to console for command-line viewing."""
+    total_infra = sum(t['infra'] for t in targets) if targets else 0
+
+    print("\n📊 Summary:")
+    print(f"  Found {len(targets)} potential raid targets")
+    print(f"  Total target infrastructure: {total_infra:,.2f}")
+    if targets:
+        print(f"  Average infra per target: {total_infra/len(targets):,.2f}")
+    else:
+        print("  No targets found")
+    
+    print(f"\n🎯 Top {len(targets)} Raid Targets (sorted by infrastructure):")
+    for i, t in enumerate(targets, 1):
+        nation_url = f"https://politicsandwar.com/nation/id={t['id']}"
+        print(f"{i}. {t['name']} (ID: {t['id']}) | {t['alliance']}")
+        print(f"  Score: {t['score']:,.2f} | Infra: {t['infra']:,.2f} | Cities: {t.get('city_count', '?')}")
+        print(f"  Intel: {t['spies']} spies | Troops: {t['soldiers']:,}/{t['max_soldiers']:,}")
+        print(f"  Inactive: {t['inactive_days']}d | Last war: {format_hours(t.get('hours_since_war'))} ago")
+        print(f"  URL: {nation_url}")
+        print(f"  Attack: https://politicsandwar.com/nation/war/declare/id={t['id']}")
+        print()
+
+def run_scan_job(api_key, args, progress=None):
+    """Scan run by a background job."""
+    my_nation, targets = get_raid_targets(api_key, args, progress=progress)
+    print_scan_summary(targets)
+    return my_nation, targets
+
+def flash_scan_error(error_message):
+    """Flash a user-friendly message for a failed scan."""
+    print(f"API Error: {error_message}")
+    
+    # Check for common error types and provide more specific messages
+    if "API_KEY" in error_message:
+        flash("Politics & War API key is missing or invalid. Please check your environment configuration.", "error")
+    elif "authentication failed" in error_message or "invalid or expired" in error_message:
+        flash("Authentication to Politics & War API failed. Please check your API key.", "error")
+    elif "rate limit" in error_message.lower():
+        flash("Politics & War API rate limit exceeded. Please wait a few minutes and try again.", "error")
+    else:
+        # General API error message
+        flash(f"Politics & War API Error: {error_message}", "error")
+
 @app.route('/scan', methods=['GET', 'POST'])
 def scan():
-    """Process the form and scan for raid targets."""
+    """Process the form and start a background scan for raid targets."""
     if request.method == 'GET':
         # If someone navigates directly to /scan, redirect them to the form
         return redirect(url_for('index'))
@@ -42,81 +103,20 @@ def scan():
             args.troop_ratio = float(request.form.get('troop_ratio', MAX_SOLDIER_RATIO))
             args.limit = int(request.form.get('limit', 10))
             args.max_pages = int(request.form.get('max_pages', MAX_PAGES))
+            args.refresh_me = request.form.get('refresh_me') == 'true'
+            # Request fixed score bands so users with nearby scores share cached pages
+            args.shared_pages = True
         except (ValueError, TypeError) as e:
             flash(f"Invalid form data: {str(e)}", "error")
             return redirect(url_for('index'))
-        args.api_key = request.form.get('api_key') # Get API key from form
-
-        try:
-            # Get raid targets
-            my_nation, targets = get_raid_targets(args.api_key, args) # Pass API key to function
-        except ValueError as e:
-            # Handle expected API errors with a clear user message
-            error_message = str(e)
-            print(f"API Error: {error_message}")
-            
-            # Check for common error types and provide more specific messages
-            if "API_KEY" in error_message:
-                flash("Politics & War API key is missing or invalid. Please check your environment configuration.", "error")
-            elif "authentication failed" in error_message or "invalid or expired" in error_message:
-                flash("Authentication to Politics & War API failed. Please check your API key.", "error")
-            elif "rate limit" in error_message.lower():
-                flash("Politics & War API rate limit exceeded. Please wait a few minutes and try again.", "error")
-            else:
-                # General API error message
-                flash(f"Politics & War API Error: {error_message}", "error")
-                
-            return redirect(url_for('index'))
-        except Exception as e:
-            # Handle unexpected errors
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"Error in get_raid_targets: {str(e)}\n{error_details}")
-            flash(f"An unexpected error occurred: {str(e)}", "error")
+        api_key = request.form.get('api_key') # Get API key from form
+        if not api_key:
+            flash_scan_error("API_KEY is not provided. Please enter your Politics & War API key.")
             return redirect(url_for('index'))
-        
-        # Calculate summary statistics
-        total_infra = sum(t['infra'] for t in targets) if targets else 0
-        
-        # Print summary and results to console for command-line viewing
-        print("\n📊 Summary:")
-        print(f"  Found {len(targets)} potential raid targets")
-        print(f"  Total target infrastructure: {total_infra:,.2f}")
-        if targets:
-            print(f"  Average infra per target: {total_infra/len(targets):,.2f}")
-        else:
-            print("  No targets found")
-        
-        print(f"\n🎯 Top {len(targets)} Raid Targets (sorted by infrastructure):")
-        for i, t in enumerate(targets, 1):
-            nation_url = f"https://politicsandwar.com/nation/id={t['id']}"
-            print(f"{i}. {t['name']} (ID: {t['id']}) | {t['alliance']}")
-            print(f"  Score: {t['score']:,.2f} | Infra: {t['infra']:,.2f} | Cities: {t.get('city_count', '?')}")
-            print(f"  Intel: {t['spies']} spies | Troops: {t['soldiers']:,}/{t['max_soldiers']:,}")
-            print(f"  Inactive: {t['inactive_days']}d | Last war: {format_hours(t.get('hours_since_war'))} ago")
-            print(f"  URL: {nation_url}")
-            print(f"  Attack: https://politicsandwar.com/nation/war/declare/id={t['id']}")
-            print()
-        
-        # Prepare data for template
-        data = {
-            'my_nation': my_nation,
-            'targets': targets if targets else [],  # Ensure targets is never None
-            'params': {
-                'min_infra': args.min_infra,
-                'max_infra': args.max_infra,
-                'inactive_time': args.inactive_time,
-                'ignore_dnr': args.ignore_dnr,
-                'troop_ratio': args.troop_ratio,
-                'limit': args.limit,
-                'max_pages': args.max_pages
-            }
-        }
-        
-        # Helper functions for templates - pass as separate arguments to avoid string formatting issues
-        return render_template('results.html', data=data, 
-                              format_money=format_money, 
-                              format_hours=format_hours)
+
+        # The scan runs on the job worker pool, the browser follows its progress
+        job = jobs.submit(run_scan_job, api_key, args, scan_params(args))
+        return redirect(url_for('scan_job', job_id=job.id))
     
     except Exception as e:
         import traceback
@@ -125,6 +125,93 @@ def scan():
         flash(f"An unexpected error occurred: {str(e)}", "error")
         return redirect(url_for('index'))
 
+@app.route('/scan/<job_id>')
+def scan_job(job_id):
+    """Show a scan: live progress while it runs, the results once it is done."""
+    job = jobs.get(job_id)
+    if job is None:
+        flash("This scan has expired or does not exist. Please start a new scan.", "error")
+        return redirect(url_for('index'))
+    if job.status == "error":
+        flash_scan_error(job.error)
+        return redirect(url_for('index'))
+
+    # Prepare data for template
+    data = {
+        'my_nation': job.my_nation,
+        'targets': job.targets if job.targets else [],  # Ensure targets is never None
+        'params': job.params
+    }
+    
+    # Helper functions for templates - pass as separate arguments to avoid string formatting issues
+    with metrics.timed("render"):
+        return render_template('results.html', data=data,
+                              job=None if job.finished else job,
+                              format_money=format_money, 
+                              format_hours=format_hours)
+
+@app.route('/scan/<job_id>/events')
+def scan_job_events(job_id):
+    """Stream a scan's progress as Server-Sent Events."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Scan not found'}), 404
+
+    def generate():
+        for event in job.stream():
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def wants_ndjson(req_data):
+    """Whether an /api/scan client asked for a streamed NDJSON response."""
+    return bool(req_data.get('stream')) or request.accept_mimetypes.best == 'application/x-ndjson'
+
+def ndjson_summary(job, profiles):
+    """Final NDJSON event of a finished scan: every kept target, best first."""
+    if profiles:
+        return {'type': 'summary',
+                'profiles': [{'name': p.name, 'count': len(targets), 'targets': targets}
+                             for p, targets in zip(profiles, job.targets)]}
+    return {'type': 'summary',
+            'count': len(job.targets),
+            'total_infra': sum(t['infra'] for t in job.targets),
+            'targets': job.targets}
+
+def stream_api_scan(api_key, args, profiles=None):
+    """
+    Run an /api/scan request as a background job and stream its events as NDJSON.
+
+    Lines are "params", "status", "my_nation", "page", "target" (as each target
+    is kept), then "summary" or "error". "keep-alive" lines are sent while a
+    page is slow.
+    """
+    if profiles:
+        job = jobs.submit(lambda key, scan_args, progress: get_profile_targets(key, scan_args, profiles, progress),
+                          api_key, args, scan_params(args))
+    else:
+        job = jobs.submit(run_scan_job, api_key, args, scan_params(args))
+
+    def generate():
+        params = {'type': 'params', 'job_id': job.id, 'params': scan_params(args)}
+        if profiles:
+            params['profiles'] = [dict(scan_params(p), name=p.name) for p in profiles]
+        yield json.dumps(params) + "\n"
+
+        for event in job.stream():
+            if event is None:
+                event = {'type': 'keep-alive'}
+            elif event['type'] == 'done':
+                event = ndjson_summary(job, profiles)
+            yield json.dumps(event) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/scan', methods=['POST'])
 def api_scan():
     """API endpoint to get raid targets as JSON."""
@@ -150,12 +237,33 @@ def api_scan():
             args.troop_ratio = float(req_data.get('troop_ratio', MAX_SOLDIER_RATIO))
             args.limit = int(req_data.get('limit', 10))
             args.max_pages = int(req_data.get('max_pages', MAX_PAGES))
+            args.refresh_me = bool(req_data.get('refresh_me', False))
+            # Request fixed score bands so users with nearby scores share cached pages
+            args.shared_pages = True
+            # Optional list of filter profiles, all evaluated in one scan
+            profiles = make_profiles(args, req_data.get('profiles')) if req_data.get('profiles') else None
         except (ValueError, TypeError) as e:
             return jsonify({'error': f'Invalid parameter: {str(e)}'}), 400
+        api_key = req_data.get('api_key')
+
+        if wants_ndjson(req_data):
+            if not api_key:
+                return jsonify({'error': 'Authentication failed',
+                                'message': 'API_KEY is not provided. Please enter your Politics & War API key.'}), 401
+            return stream_api_scan(api_key, args, profiles)
         
         try:
+            if profiles:
+                my_nation, results = get_profile_targets(api_key, args, profiles)
+                return jsonify({
+                    'my_nation': my_nation,
+                    'profiles': [{'name': p.name, 'targets': targets, 'params': scan_params(p)}
+                                 for p, targets in zip(profiles, results)],
+                    'params': scan_params(args)
+                })
+
             # Get raid targets
-            my_nation, targets = get_raid_targets(args)
+            my_nation, targets = get_raid_targets(api_key, args)
             
             # Calculate summary statistics
             total_infra = sum(t['infra'] for t in targets) if targets else 0
@@ -195,15 +303,7 @@ def api_scan():
         return jsonify({
             'my_nation': my_nation,
             'targets': targets,
-            'params': {
-                'min_infra': args.min_infra,
-                'max_infra': args.max_infra,
-                'inactive_time': args.inactive_time,
-                'ignore_dnr': args.ignore_dnr,
-                'troop_ratio': args.troop_ratio,
-                'limit': args.limit,
-                'max_pages': args.max_pages
-            }
+            'params': scan_params(args)
         })
     
     except Exception as e:
@@ -212,5 +312,10 @@ def api_scan():
         print(f"Unhandled error in API scan route: {str(e)}\n{error_details}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Scan instrumentation in the Prometheus text format."""
+    return Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=DEBUG)
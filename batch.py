@@ -0,0 +1,169 @@
+from pnw_api import get_my_nation, get_nations, PagePrefetcher, BATCH_MAX_PAGES
+from filter import build_nation_filter
+from records import decode_nations
+from nation_index import NationIndex
+from columnar import to_columns
+from parallel import filter_many
+from snapshot import open_snapshot, load_nations
+from config import MIN_SCORE_RATIO, MAX_SCORE_RATIO
+
+# What a member nation looked up by ID needs to stand in for get_my_nation
+MEMBER_FIELDS = ["id", "nation_name", "score", "soldiers", "spies", "alliance_id",
+                 ("alliance", ["id", "name", ("treaties", ["alliance1_id", "alliance2_id", "treaty_type"])])]
+
+def member_label(nation):
+    return f"{nation.get('nation_name') or 'Nation'} ({nation['id']})"
+
+def load_members(api_key, member_keys=(), member_ids=()):
+    """
+    Look up the attacking nations of a batch scan.
+
+    Args:
+        api_key: The Politics & War API key used for nation ID lookups
+        member_keys: API keys of members (each fetches its own nation)
+        member_ids: Nation IDs of members
+
+    Returns:
+        List of member nation dictionaries in get_my_nation format
+    """
+    members = [get_my_nation(key) for key in member_keys]
+
+    member_ids = sorted(set(int(i) for i in member_ids))
+    for start in range(0, len(member_ids), 500):
+        chunk = member_ids[start:start + 500]
+        found = get_nations(api_key, 1, filters={"id": chunk}, fields=MEMBER_FIELDS, use_cache=False)["data"]
+        missing = set(chunk) - {int(n["id"]) for n in found}
+        if missing:
+            raise ValueError(f"Nations not found: {', '.join(str(i) for i in sorted(missing))}")
+        members.extend(found)
+
+    if not members:
+        raise ValueError("No members to scan")
+    return members
+
+def combined_score_range(members):
+    """Smallest score range covering every member's war range."""
+    scores = [float(m["score"]) for m in members]
+    return min(scores) * MIN_SCORE_RATIO, max(scores) * MAX_SCORE_RATIO
+
+def fetch_dataset(api_key, members, args, fields=None):
+    """
+    Fetch every nation any member could attack in one sweep.
+
+    Reads the local snapshot with args.offline, otherwise fetches pages
+    filtered server-side to the combined war range of all members.
+
+    Returns:
+        NationIndex over the fetched nations
+    """
+    min_score, max_score = combined_score_range(members)
+    print(f"Fetching nations with score {min_score:,.2f} - {max_score:,.2f} for {len(members)} member(s)...")
+
+    if getattr(args, "offline", False):
+        conn = open_snapshot(args.snapshot)
+        try:
+            records = decode_nations(load_nations(conn, min_score=min_score, max_score=max_score))
+        finally:
+            conn.close()
+    else:
+        nation_filter = build_nation_filter(members[0], ignore_alliance=args.ignore_dnr)
+        nation_filter["min_score"], nation_filter["max_score"] = min_score, max_score
+        records = []
+        last_page, has_more = 0, False
+        with PagePrefetcher(api_key, args.max_pages, filters=nation_filter, fields=fields,
+                            batch_pages=getattr(args, "batch_pages", BATCH_MAX_PAGES)) as prefetcher:
+            for page, nations_data, error in prefetcher:
+                if error is not None:
+                    raise ValueError(f"Error fetching page {page}: {str(error)}")
+                records.extend(decode_nations(nations_data.get("data", [])))
+                last_page = page
+                has_more = nations_data.get("paginatorInfo", {}).get("hasMorePages")
+        if has_more and last_page >= args.max_pages:
+            print(f"⚠️ Stopped at --max-pages {args.max_pages}, lower-score nations were not fetched")
+
+    print(f"Loaded {len(records):,} nations")
+    return NationIndex(records)
+
+def member_candidates(index, member, args, filter_nations, protected):
+    """
+    Targets for one member, best first.
+
+    The member's war range, infra range and inactivity threshold are range
+    queries on the index, so only nations inside them reach the filter.
+    """
+    nations = index.candidates(member, min_infra=args.min_infra, max_infra=args.max_infra,
+                               min_inactive_days=args.inactive_time)
+    return filter_nations(nations, member, protected)
+
+def deconflict(candidates, limit):
+    """
+    Assign each target to at most one member.
+
+    Members pick their best remaining target in turns, the member with the
+    fewest candidates first, until everyone has `limit` targets or runs out.
+
+    Args:
+        candidates: Dictionary mapping member label to targets, best first
+        limit: Most targets per member
+
+    Returns:
+        Dictionary mapping member label to its assigned targets
+    """
+    assigned = {label: [] for label in candidates}
+    taken = set()
+    positions = {label: 0 for label in candidates}
+    order = sorted(candidates, key=lambda label: len(candidates[label]))
+
+    active = True
+    while active:
+        active = False
+        for label in order:
+            targets = candidates[label]
+            if len(assigned[label]) >= limit:
+                continue
+            while positions[label] < len(targets) and targets[positions[label]]["id"] in taken:
+                positions[label] += 1
+            if positions[label] < len(targets):
+                target = targets[positions[label]]
+                assigned[label].append(target)
+                taken.add(target["id"])
+                positions[label] += 1
+                active = True
+    return assigned
+
+def scan_members(api_key, members, args, filter_nations, load_protected, fields=None, criteria=None):
+    """
+    Find raid targets for several member nations from one data pass.
+
+    Args:
+        api_key: The Politics & War API key used for fetching nations
+        members: Member nations (see load_members)
+        args: Scan arguments (see raid.parse_args), args.deconflict assigns
+            each target to one member only
+        filter_nations: Callable(nations, my_nation, protected_alliances) returning targets
+        load_protected: Callable(api_key, my_nation, args) returning protected alliance IDs
+        fields: Field selection for fetched pages
+        criteria: columnar.match_mask keyword arguments, needed when
+            args.workers > 1 spreads all members' filters over processes
+
+    Returns:
+        Dictionary mapping member label to targets sorted by infrastructure
+    """
+    index = fetch_dataset(api_key, members, args, fields)
+
+    candidates = {}
+    if getattr(args, "workers", 1) > 1 and criteria is not None:
+        # One sharded pass answers every member's query
+        queries = [(member, dict(criteria, protected_alliances=load_protected(api_key, member, args)))
+                   for member in members]
+        limit = None if getattr(args, "deconflict", False) else args.limit
+        results = filter_many(to_columns(index.records), queries, limit=limit, workers=args.workers)
+        candidates = {member_label(member): targets for member, targets in zip(members, results)}
+    else:
+        for member in members:
+            protected = load_protected(api_key, member, args)
+            candidates[member_label(member)] = member_candidates(index, member, args, filter_nations, protected)
+
+    if getattr(args, "deconflict", False):
+        return deconflict(candidates, args.limit)
+    return {label: targets[:args.limit] for label, targets in candidates.items()}
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded cache whose entries expire after `ttl` seconds.
+
+    When full, the least recently used entry is evicted. Hit and miss
+    counts are kept for reporting.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value), oldest use first
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if time.monotonic() < expires_at:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class _Flight:
+    __slots__ = ("done", "result", "ok")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.ok = False
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key onto one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait and receive the same result. Errors are not shared:
+    the function may depend on the caller (an API key that is invalid or
+    rate limited), so when the leader fails the waiters run their own
+    function again, coalescing onto a new flight.
+    """
+
+    def __init__(self):
+        self.shared = 0  # Calls answered by another caller's execution
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+
+            if leader:
+                break
+            flight.done.wait()
+            if flight.ok:
+                with self._lock:
+                    self.shared += 1
+                return flight.result
+
+        try:
+            flight.result = fn()
+            flight.ok = True
+            return flight.result
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
@@ -0,0 +1,256 @@
+import json
+import mmap
+import os
+import struct
+import numpy as np
+from columnar import to_columns, NATION_COLORS
+from records import NationRecord
+from snapshot import open_snapshot, load_nations, snapshot_info
+
+# File layout: MAGIC, header length (uint32), JSON header, then each array
+# starting at a multiple of ALIGN. Numeric columns are stored raw in little
+# endian, string columns as an offsets array plus one UTF-8 blob.
+MAGIC = b"PNWCOLS1"
+ALIGN = 64
+
+NUMERIC_COLUMNS = {
+    "id": "<i8",
+    "score": "<f8",
+    "soldiers": "<i8",
+    "spies": "<i8",
+    "vmode_turns": "<i8",
+    "color": "i1",
+    "alliance_id": "<i8",
+    "infra": "<f8",
+    "city_count": "<i4",
+    "last_active": "<f8",
+    "last_war": "<f8",
+    "def_wars": "<i4"
+}
+STRING_COLUMNS = ("name", "alliance_name")
+
+def columns_path(snapshot_path):
+    """Columnar file kept next to a SQLite snapshot (nations.db -> nations.cols)."""
+    return os.path.splitext(snapshot_path)[0] + ".cols"
+
+def write_columns(path, nations, source_version=None):
+    """
+    Write nations to a columnar file, sorted by score.
+
+    The file is written next to `path` and renamed into place, so readers
+    never see a partial file.
+
+    Args:
+        path: Output file path
+        nations: NationRecords or raw nation dicts (e.g. get_nations()["data"])
+        source_version: Optional number stored in the header, used to tell
+            whether the file is older than its source
+
+    Returns:
+        Number of nations written
+    """
+    columns = to_columns(nations)
+    rows = columns.pop("rows")
+    columns["id"] = np.fromiter((n.id for n in rows), np.int64, len(rows))
+    order = np.argsort(columns["score"], kind="stable")
+
+    blobs = {}
+    for name in NUMERIC_COLUMNS:
+        blobs[name] = np.ascontiguousarray(columns[name][order], dtype=NUMERIC_COLUMNS[name]).tobytes()
+    for name in STRING_COLUMNS:
+        encoded = [(getattr(rows[i], name) or "").encode("utf-8") for i in order]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+        np.cumsum([len(s) for s in encoded], out=offsets[1:])
+        blobs[f"{name}.offsets"] = offsets.tobytes()
+        blobs[f"{name}.data"] = b"".join(encoded)
+
+    # Offsets are relative to the data section, which starts after the header
+    header = {"count": len(rows), "source_version": source_version, "columns": {}}
+    offset = 0
+    for name, blob in blobs.items():
+        header["columns"][name] = [offset, len(blob)]
+        offset += -(-len(blob) // ALIGN) * ALIGN
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 4 + len(header_bytes)) // ALIGN) * ALIGN
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for name, blob in blobs.items():
+            f.seek(data_start + header["columns"][name][0])
+            f.write(blob)
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+    return len(rows)
+
+class ColumnRows:
+    """
+    NationRecords for a range of a ColumnStore, built on access.
+
+    Stands in for the "rows" list of columnar.to_columns, so only nations
+    that are actually reported get turned into objects.
+    """
+
+    def __init__(self, store, start=0, stop=None):
+        self.store = store
+        self.start = start
+        self.stop = store.count if stop is None else stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, _ = i.indices(len(self))
+            return ColumnRows(self.store, self.start + start, self.start + stop)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.store.record(self.start + int(i))
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self.store.record(i)
+
+class ColumnStore:
+    """
+    Read-only, memory-mapped view of a columnar nation file.
+
+    Numeric columns are NumPy arrays backed directly by the mapped file, so
+    opening costs a header parse and nothing is copied until it is used.
+    Nations are sorted by score.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a columnar nation file")
+
+        header_len = struct.unpack_from("<I", self._mmap, len(MAGIC))[0]
+        header_start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[header_start:header_start + header_len])
+        self.count = self.header["count"]
+        data_start = -(-(header_start + header_len) // ALIGN) * ALIGN
+
+        def view(name, dtype):
+            offset, length = self.header["columns"][name]
+            return np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                                 offset=data_start + offset)
+
+        self.columns = {name: view(name, dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+        self._strings = {}
+        for name in STRING_COLUMNS:
+            offset, _ = self.header["columns"][f"{name}.data"]
+            self._strings[name] = (view(f"{name}.offsets", "<i8"), data_start + offset)
+
+    @property
+    def source_version(self):
+        return self.header.get("source_version")
+
+    def string(self, name, i):
+        offsets, data_start = self._strings[name]
+        return self._mmap[data_start + offsets[i]:data_start + offsets[i + 1]].decode("utf-8")
+
+    def record(self, i):
+        """Build the NationRecord for row i."""
+        c = self.columns
+        last_war = float(c["last_war"][i])
+        color = int(c["color"][i])
+        return NationRecord(
+            id=int(c["id"][i]),
+            name=self.string("name", i),
+            score=float(c["score"][i]),
+            last_active=float(c["last_active"][i]),
+            alliance_id=int(c["alliance_id"][i]),
+            alliance_name=self.string("alliance_name", i) or None,
+            soldiers=int(c["soldiers"][i]),
+            spies=int(c["spies"][i]),
+            vmode_turns=int(c["vmode_turns"][i]),
+            color=NATION_COLORS[color] if 0 <= color < len(NATION_COLORS) else "",
+            total_infra=float(c["infra"][i]),
+            city_count=int(c["city_count"][i]),
+            last_war=None if np.isnan(last_war) else last_war,
+            def_wars=int(c["def_wars"][i])
+        )
+
+    def score_range(self, min_score=None, max_score=None):
+        """
+        Columns for nations with min_score <= score <= max_score.
+
+        Returns:
+            Dictionary in the columnar.to_columns format whose arrays are
+            views into the mapped file
+        """
+        scores = self.columns["score"]
+        start = 0 if min_score is None else int(np.searchsorted(scores, min_score, side="left"))
+        stop = self.count if max_score is None else int(np.searchsorted(scores, max_score, side="right"))
+        stop = max(start, stop)
+        columns = {name: values[start:stop] for name, values in self.columns.items() if name != "id"}
+        columns["rows"] = ColumnRows(self, start, stop)
+        return columns
+
+    def close(self):
+        # Views into the map must be gone before it can be closed
+        self.columns = {}
+        self._strings = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def snapshot_version(info):
+    """Latest change to a SQLite snapshot, from snapshot_info()."""
+    return max(info["newest_sync"] or 0, info["watermark"] or 0)
+
+def export_snapshot(snapshot_path, path=None):
+    """
+    Write the columnar file for a SQLite snapshot.
+
+    Returns:
+        Number of nations written
+    """
+    path = path or columns_path(snapshot_path)
+    conn = open_snapshot(snapshot_path)
+    try:
+        version = snapshot_version(snapshot_info(conn))
+        nations = load_nations(conn)
+    finally:
+        conn.close()
+    count = write_columns(path, nations, source_version=version)
+    print(f"Wrote {count:,} nations to {path}")
+    return count
+
+def open_store(snapshot_path, info):
+    """
+    Open the columnar file for a snapshot, rewriting it first if it is
+    missing or older than the snapshot.
+
+    Args:
+        snapshot_path: Path to the SQLite snapshot
+        info: snapshot_info() of that snapshot
+
+    Returns:
+        ColumnStore
+    """
+    path = columns_path(snapshot_path)
+    try:
+        store = ColumnStore(path)
+        if store.source_version == snapshot_version(info):
+            return store
+        store.close()
+    except (OSError, ValueError):
+        pass
+    export_snapshot(snapshot_path, path)
+    return ColumnStore(path)
@@ -0,0 +1,135 @@
+import time
+import numpy as np
+from config import MIN_SCORE_RATIO, MAX_SCORE_RATIO, MAX_SOLDIER_RATIO, MAX_SPIES_RATIO
+from filter import NATION_COLORS, target_result, scan_protected_alliances
+from records import decode_nations
+
+COLOR_CODES = {color: code for code, color in enumerate(NATION_COLORS)}
+BEIGE = COLOR_CODES["beige"]
+UNKNOWN_COLOR = -1
+
+def to_columns(nations):
+    """
+    Decode nations into NumPy columns, once.
+
+    Rows that cannot be decoded are dropped, the same way filter_targets
+    skips them.
+
+    Parameters:
+    - nations: List of NationRecords (or raw nation data from the API or a snapshot)
+
+    Returns:
+    - Dictionary of equal-length arrays, plus "rows" holding the NationRecords
+    """
+    records = decode_nations(nations)
+    count = len(records)
+    nan = float("nan")
+
+    def column(values, dtype):
+        return np.fromiter(values, dtype=dtype, count=count)
+
+    return {
+        "score": column((n.score for n in records), np.float64),
+        "soldiers": column((n.soldiers for n in records), np.int64),
+        "spies": column((n.spies for n in records), np.int64),
+        "vmode_turns": column((n.vmode_turns for n in records), np.int64),
+        "color": column((COLOR_CODES.get(n.color, UNKNOWN_COLOR) for n in records), np.int8),
+        "alliance_id": column((n.alliance_id for n in records), np.int64),
+        "infra": column((n.total_infra for n in records), np.float64),
+        "city_count": column((n.city_count for n in records), np.int32),
+        "last_active": column((n.last_active for n in records), np.float64),
+        # NaN when the nation has no wars
+        "last_war": column((nan if n.last_war is None else n.last_war for n in records), np.float64),
+        "def_wars": column((n.def_wars for n in records), np.int32),
+        "rows": records
+    }
+
+def match_mask(columns, my_nation, min_infra=1500, max_infra=20000, min_inactive_days=2,
+               ignore_alliance=False, max_soldier_ratio=MAX_SOLDIER_RATIO, check_wars=True, now=None,
+               protected_alliances=None):
+    """
+    Evaluate every raid criterion as a boolean mask over decoded columns.
+
+    Takes the same criteria as filter.filter_targets.
+
+    Returns:
+    - Boolean array, True for nations that match
+    """
+    now = time.time() if now is None else now
+
+    min_score = float(my_nation["score"]) * MIN_SCORE_RATIO
+    max_score = float(my_nation["score"]) * MAX_SCORE_RATIO
+    max_soldiers = int(float(my_nation["soldiers"]) * max_soldier_ratio)
+    max_spies = int(float(my_nation.get("spies", 0)) * MAX_SPIES_RATIO)
+
+    mask = columns["vmode_turns"] <= 0
+    mask &= columns["color"] != BEIGE
+
+    if check_wars:
+        has_wars = ~np.isnan(columns["last_war"])
+        mask &= ~(has_wars & (columns["def_wars"] > 0))
+        with np.errstate(invalid="ignore"):
+            mask &= ~(has_wars & ((now - columns["last_war"]) / 3600 < 24))
+
+    days_inactive = np.floor((now - columns["last_active"]) / 86400)
+    mask &= days_inactive > min_inactive_days
+
+    if not ignore_alliance:
+        mask &= columns["alliance_id"] == 0
+    elif protected_alliances:
+        mask &= ~np.isin(columns["alliance_id"], np.fromiter(protected_alliances, np.int64))
+
+    mask &= (columns["score"] >= min_score) & (columns["score"] <= max_score)
+    mask &= columns["soldiers"] <= max_soldiers
+    mask &= columns["spies"] <= max_spies
+    mask &= (columns["infra"] >= min_infra) & (columns["infra"] <= max_infra)
+    return mask
+
+def build_results(columns, indices, my_nation, max_soldier_ratio=MAX_SOLDIER_RATIO, check_wars=True, now=None):
+    """Build result dictionaries, in the filter_targets format, for the given row indices."""
+    now = time.time() if now is None else now
+    max_soldiers = int(float(my_nation["soldiers"]) * max_soldier_ratio)
+
+    results = []
+    for i in indices:
+        last_war = columns["last_war"][i]
+        hours_since_war = None
+        if check_wars and not np.isnan(last_war):
+            hours_since_war = (now - last_war) / 3600
+        days_inactive = int((now - columns["last_active"][i]) // 86400)
+        results.append(target_result(columns["rows"][i], max_soldiers, days_inactive, hours_since_war))
+    return results
+
+def filter_targets_columnar(nations, my_nation, min_infra=1500, max_infra=20000,
+                            min_inactive_days=2, ignore_alliance=False, max_soldier_ratio=MAX_SOLDIER_RATIO,
+                            protected_treaty_types=None, check_wars=True, protected_alliances=None):
+    """
+    Columnar drop-in replacement for filter.filter_targets.
+
+    The page (or whole snapshot) is put into arrays once and all criteria are
+    evaluated as vectorized masks. `nations` may also be a columns dictionary
+    already in the to_columns format, e.g. from colstore.ColumnStore.
+
+    Returns:
+    - List of nation dictionaries that match criteria, sorted by infrastructure
+    """
+    now = time.time()
+    if protected_alliances is None:
+        protected_alliances = scan_protected_alliances(my_nation, ignore_alliance, protected_treaty_types)
+    columns = nations if isinstance(nations, dict) else to_columns(nations)
+    print(f"Filtering {len(columns['rows'])} nations (columnar)...")
+
+    mask = match_mask(columns, my_nation, min_infra=min_infra, max_infra=max_infra,
+                      min_inactive_days=min_inactive_days, ignore_alliance=ignore_alliance,
+                      max_soldier_ratio=max_soldier_ratio, check_wars=check_wars, now=now,
+                      protected_alliances=protected_alliances)
+
+    # Highest infrastructure first
+    indices = np.flatnonzero(mask)
+    indices = indices[np.argsort(-columns["infra"][indices], kind="stable")]
+
+    results = build_results(columns, indices, my_nation, max_soldier_ratio=max_soldier_ratio,
+                            check_wars=check_wars, now=now)
+    for t in results:
+        print(f"✅ MATCH: {t['name']} - {t['infra']:,.2f} infra, {t['inactive_days']}d inactive")
+    return results
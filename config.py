@@ -18,9 +18,28 @@ MAX_PAGES = 10  # Maximum number of pages to fetch from the API
 MIN_SCORE_RATIO = 0.75  # Can down-declare to 25% of your score for raid wars
 MAX_SCORE_RATIO = 1.5  # Can up-declare to 150% of your score for raid wars
 
+# Web scans widen the war range to bands whose bounds are powers of this ratio,
+# so users with nearby scores request the same (shared, cached) pages
+SCORE_BAND_RATIO = 1.1
+
+# Infrastructure adds 1 score per 40 infra and every other score component is
+# non-negative, so a nation never has more than 40x its score in infra
+INFRA_PER_SCORE = 40
+
 # Military requirements
 MAX_SOLDIER_RATIO = 0.75  # Target must have less than 10% of your troops to minimize casualties
 MAX_SPIES_RATIO = 5.0  # Target must have less than 100% of your spies to minimize losses
 
+# Local nation snapshot store
+SNAPSHOT_PATH = os.getenv("PNW_SNAPSHOT_PATH", "nations.db")  # SQLite file used by --sync and --offline
+SNAPSHOT_MAX_AGE = 15 * 60  # Seconds before a stored page is refetched by --sync
+DELTA_MAX_PAGES = 20  # Pages a delta sync may read before falling back to a full sync
+DELTA_OVERLAP = 5 * 60  # Seconds each delta sync re-reads before the previous watermark (clock skew)
+
+# Watch mode (--watch)
+TURN_SECONDS = 2 * 60 * 60  # Turns change every 2 hours, on even UTC hours
+WATCH_TURN_DELAY = 30  # Seconds after turn change before refreshing, so the turn has been processed
+WATCH_INTERVAL = 5 * 60  # Seconds between refreshes within a turn
+
 # Web app settings
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
@@ -1,6 +1,9 @@
+import math
+import time
 from datetime import datetime, timedelta
-from config import MIN_SCORE_RATIO, MAX_SCORE_RATIO, MAX_SOLDIER_RATIO, MAX_SPIES_RATIO
-from pnw_api import has_treaty
+from config import MIN_SCORE_RATIO, MAX_SCORE_RATIO, MAX_SOLDIER_RATIO, MAX_SPIES_RATIO, SCORE_BAND_RATIO
+from pnw_api import protected_alliance_ids
+from records import decode_nations
 
 def total_infra(cities):
     """Calculate the total infrastructure of all cities."""
@@ -73,14 +76,118 @@ def count_active_wars(wars, nation_id):
             active_count += 1
     return active_count, 0  # Return count of active wars, 0 for defending
 
+# Every nation color; beige nations are protected and never worth fetching
+NATION_COLORS = ['aqua', 'beige', 'black', 'blue', 'brown', 'gray', 'green', 'lime',
+                 'maroon', 'olive', 'orange', 'pink', 'purple', 'red', 'white', 'yellow']
+
+def score_band(min_score, max_score, ratio=SCORE_BAND_RATIO):
+    """
+    Widen a score range out to the nearest bounds of a fixed geometric grid.
+
+    Bounds are powers of ratio, so every user whose war range falls between
+    the same two grid points requests exactly the same range.
+    """
+    low = ratio ** math.floor(math.log(min_score, ratio)) if min_score > 0 else 0
+    high = ratio ** math.ceil(math.log(max_score, ratio)) if max_score > 0 else 0
+    # Two decimals keep the query text stable, rounded outwards so the band still covers the range
+    return math.floor(low * 100) / 100, math.ceil(high * 100) / 100
+
+def build_nation_filter(my_nation, ignore_alliance=False, shared_band=False):
+    """
+    Build the server-side nation filter for a scan.
+
+    The API then only returns nations inside war range, out of vacation mode,
+    not beige and (unless ignore_alliance) without an alliance, ordered by
+    score so the largest targets come first. filter_targets still checks the
+    same criteria locally.
+
+    Parameters:
+    - my_nation: Your nation data
+    - ignore_alliance: Whether to include nations with alliances
+    - shared_band: Widen the war range to a fixed score band (see score_band),
+      so users with nearby scores request the same pages and share them
+      through the nation cache
+
+    Returns:
+    - Filter spec dictionary for pnw_api.get_nations
+    """
+    score = float(my_nation["score"])
+    min_score, max_score = score * MIN_SCORE_RATIO, score * MAX_SCORE_RATIO
+    if shared_band:
+        min_score, max_score = score_band(min_score, max_score)
+    return {
+        "min_score": min_score,
+        "max_score": max_score,
+        "vmode": False,
+        "color": [color for color in NATION_COLORS if color != "beige"],
+        "alliance_id": None if ignore_alliance else [0],
+        "order_by": ("SCORE", "DESC")
+    }
+
+def required_fields(ignore_alliance=False, check_wars=True):
+    """
+    Nation fields filter_targets needs for the given options.
+
+    Parameters:
+    - ignore_alliance: Whether nations with alliances are included (their alliance name is shown)
+    - check_wars: Whether war activity is checked
+
+    Returns:
+    - Field selection for pnw_api.get_nations
+    """
+    fields = ["id", "nation_name", "score", "last_active", "alliance_id", "soldiers", "spies",
+              "vacation_mode_turns", "color", ("cities", ["infrastructure"])]
+    if ignore_alliance:
+        fields.append(("alliance", ["name"]))
+    if check_wars:
+        # Only the date of the most recent war and defensive war turns are used
+        fields.append(("wars", ["date"]))
+        fields.append(("defensive_wars", ["turnsleft"]))
+    return fields
+
+def scan_protected_alliances(my_nation, ignore_alliance=False, protected_treaty_types=None):
+    """
+    Alliance IDs a scan must skip.
+
+    Without ignore_alliance only nations without an alliance match anyway,
+    so nothing needs protecting.
+
+    Parameters:
+    - my_nation: Your nation data (with alliance and treaties)
+    - ignore_alliance: Whether nations with alliances are included
+    - protected_treaty_types: Treaty types that prevent raiding
+
+    Returns:
+    - Set of alliance IDs
+    """
+    if not ignore_alliance:
+        return set()
+    return protected_alliance_ids(my_nation.get("alliance"), protected_treaty_types)
+
+def target_result(n, max_soldiers, days_inactive, hours_since_war):
+    """Build the result dictionary for a matching NationRecord."""
+    return {
+        "name": n.name,
+        "id": n.id,
+        "infra": n.total_infra,
+        "score": n.score,
+        "inactive_days": days_inactive,
+        "spies": n.spies,
+        "soldiers": n.soldiers,
+        "max_soldiers": max_soldiers,
+        "alliance": (n.alliance_name or "Has Alliance") if n.alliance_id != 0 else "No Alliance",
+        "hours_since_war": hours_since_war,
+        "city_count": n.city_count
+    }
+
 def filter_targets(nations, my_nation, min_infra=1500, max_infra=20000, 
                   min_inactive_days=2, ignore_alliance=False, max_soldier_ratio=MAX_SOLDIER_RATIO,
-                  protected_treaty_types=None):
+                  protected_treaty_types=None, check_wars=True, protected_alliances=None):
     """
     Filter nations based on raiding criteria.
     
     Parameters:
-    - nations: List of nation data from API
+    - nations: List of NationRecords (or raw nation data from the API)
     - my_nation: Your nation data
     - min_infra: Minimum infrastructure to target
     - max_infra: Maximum infrastructure to target
@@ -88,12 +195,36 @@ def filter_targets(nations, my_nation, min_infra=1500, max_infra=20000,
     - ignore_alliance: Whether to include nations with alliances
     - max_soldier_ratio: Maximum ratio of target soldiers to your soldiers
     - protected_treaty_types: Treaty types that prevent raiding
+    - check_wars: Whether to skip nations with active defensive wars or a war in the last 24h
+    - protected_alliances: Set of alliance IDs never to target (built from your
+      alliance's treaties if not given)
     
     Returns:
     - List of nation dictionaries that match criteria, sorted by money lost
     """
-    results = []
-    now = datetime.utcnow()
+    # Print filtering status
+    print(f"Filtering {len(nations)} nations...")
+
+    # Raw dicts (e.g. from a snapshot) are decoded here, pages are already decoded at ingest
+    results = iter_targets(decode_nations(nations), my_nation, min_infra=min_infra, max_infra=max_infra,
+                           min_inactive_days=min_inactive_days, ignore_alliance=ignore_alliance,
+                           max_soldier_ratio=max_soldier_ratio, protected_treaty_types=protected_treaty_types,
+                           check_wars=check_wars, protected_alliances=protected_alliances)
+
+    # Sort by infrastructure (higher is better)
+    return sorted(results, key=lambda x: x["infra"], reverse=True)
+
+def iter_targets(records, my_nation, min_infra=1500, max_infra=20000,
+                 min_inactive_days=2, ignore_alliance=False, max_soldier_ratio=MAX_SOLDIER_RATIO,
+                 protected_treaty_types=None, check_wars=True, protected_alliances=None):
+    """
+    Yield matching targets one at a time, in input order.
+
+    Takes the same criteria as filter_targets, but `records` can be any
+    iterable of NationRecords (e.g. a pnw_api.NationStream) and nothing
+    but the current record is held.
+    """
+    now = time.time()
     
     # Calculate war range
     min_score = float(my_nation["score"]) * MIN_SCORE_RATIO
@@ -103,97 +234,71 @@ def filter_targets(nations, my_nation, min_infra=1500, max_infra=20000,
     max_soldiers = int(float(my_nation["soldiers"]) * max_soldier_ratio)
     max_spies = int(float(my_nation.get("spies", 0)) * MAX_SPIES_RATIO)
 
-    # Print filtering status
-    print(f"Filtering {len(nations)} nations...")
-    
-    for n in nations:
-        try:
-            nation_name = n.get("nation_name", "Unknown")
-            
-            # Skip nations in vacation mode
-            if n.get("vacation_mode_turns", 0) > 0:
-                #print(f"Skipping {nation_name}: vacation mode")
-                continue
+    # Alliances covered by our treaties, checked per nation by set membership
+    if protected_alliances is None:
+        protected_alliances = scan_protected_alliances(my_nation, ignore_alliance, protected_treaty_types)
 
-            # Skip nations in beige color (protected for 2 days after losing a war)
-            if n.get("color", "").lower() == "beige":
-                #print(f"Skipping {nation_name}: beige protection")
-                continue
+    for n in records:
+        # Skip nations in vacation mode
+        if n.vmode_turns > 0:
+            #print(f"Skipping {n.name}: vacation mode")
+            continue
 
-            # Check war status from last war only
-            has_active_war, hours_since_war, money_lost = get_war_stats(n, now)
-            
-            # Skip if nation has active war
-            if has_active_war:
-                #print(f"Skipping {nation_name}: has active defensive wars")
+        # Skip nations in beige color (protected for 2 days after losing a war)
+        if n.color == "beige":
+            #print(f"Skipping {n.name}: beige protection")
+            continue
+
+        # Check war status from last war only
+        hours_since_war = None
+        if check_wars and n.last_war is not None:
+            # Skip if nation has active defensive wars
+            if n.def_wars > 0:
+                #print(f"Skipping {n.name}: has active defensive wars")
                 continue
-                
+
             # Skip if last war was too recent (less than 24h ago)
-            if hours_since_war is not None and hours_since_war < 24:
-                #print(f"Skipping {nation_name}: recent war activity")
+            hours_since_war = (now - n.last_war) / 3600
+            if hours_since_war < 24:
+                #print(f"Skipping {n.name}: recent war activity")
                 continue
 
-            # Parse last active date
-            last_active = datetime.strptime(n["last_active"], "%Y-%m-%dT%H:%M:%S%z")
-            days_inactive = (now - last_active.replace(tzinfo=None)).days
-            
-            # Check inactivity threshold
-            if days_inactive <= min_inactive_days:
-                #print(f"Skipping {nation_name}: too active ({days_inactive} days)")
-                continue
+        # Check inactivity threshold
+        days_inactive = int((now - n.last_active) // 86400)
+        if days_inactive <= min_inactive_days:
+            #print(f"Skipping {n.name}: too active ({days_inactive} days)")
+            continue
 
-            # Check alliance
-            if not ignore_alliance:
-                # Skip if nation has alliance
-                if n["alliance_id"] != "0" and n["alliance_id"] is not None:
-                    #print(f"Skipping {nation_name}: has alliance")
-                    continue
+        # Skip if nation has alliance
+        if not ignore_alliance and n.alliance_id != 0:
+            #print(f"Skipping {n.name}: has alliance")
+            continue
 
-            # Must be within war range
-            if float(n["score"]) < min_score or float(n["score"]) > max_score:
-                #print(f"Skipping {nation_name}: outside war range")
-                continue
+        # Skip our own alliance and alliances we have treaties with
+        if n.alliance_id in protected_alliances:
+            #print(f"Skipping {n.name}: protected by treaty")
+            continue
 
-            # Check soldier count against ratio
-            if int(n.get("soldiers", 0)) > max_soldiers:
-                #print(f"Skipping {nation_name}: too many troops")
-                continue
+        # Must be within war range
+        if n.score < min_score or n.score > max_score:
+            #print(f"Skipping {n.name}: outside war range")
+            continue
 
-            # Check spy count against ratio
-            if int(n.get("spies", 0)) > max_spies:
-                #print(f"Skipping {nation_name}: too many spies")
-                continue
+        # Check soldier count against ratio
+        if n.soldiers > max_soldiers:
+            #print(f"Skipping {n.name}: too many troops")
+            continue
 
-            # Calculate total infrastructure
-            infra_total = total_infra(n["cities"])
-            # Check infrastructure range
-            if infra_total < min_infra or infra_total > max_infra:
-                #print(f"Skipping {nation_name}: infra outside range")
-                continue
+        # Check spy count against ratio
+        if n.spies > max_spies:
+            #print(f"Skipping {n.name}: too many spies")
+            continue
 
-            # If we get here, target meets all criteria
-            alliance_name = "No Alliance"
-            if n["alliance_id"] != "0" and n["alliance_id"] is not None:
-                alliance_name = n.get("alliance", {}).get("name", "Has Alliance")
-
-            # Found a match! Add to results
-            print(f"✅ MATCH: {nation_name} - {infra_total:,.2f} infra, {days_inactive}d inactive")
-            
-            results.append({
-                "name": n["nation_name"],
-                "id": n["id"],
-                "infra": infra_total,
-                "score": float(n["score"]),
-                "inactive_days": days_inactive,
-                "spies": int(n.get("spies", 0)),
-                "soldiers": int(n.get("soldiers", 0)),
-                "max_soldiers": max_soldiers,
-                "alliance": alliance_name,
-                "hours_since_war": hours_since_war,
-                "city_count": len(n["cities"])
-            })
-        except Exception as e:
+        # Check infrastructure range
+        if n.total_infra < min_infra or n.total_infra > max_infra:
+            #print(f"Skipping {n.name}: infra outside range")
             continue
 
-    # Sort by infrastructure (higher is better)
-    return sorted(results, key=lambda x: x["infra"], reverse=True)
+        # Found a match! Add to results
+        print(f"✅ MATCH: {n.name} - {n.total_infra:,.2f} infra, {days_inactive}d inactive")
+        yield target_result(n, max_soldiers, days_inactive, hours_since_war)
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "4"))  # Scans running at the same time
+JOB_TTL = 30 * 60  # Seconds a finished job (and its results) is kept
+HEARTBEAT_INTERVAL = 15  # Seconds between keep-alive events while a scan is quiet
+
+class ScanJob:
+    """
+    One background scan and the progress events it has produced so far.
+
+    Events are dictionaries with a "type" key ("status", "my_nation",
+    "page", "target", "done" or "error") and are kept for the life of the
+    job, so late subscribers replay everything from the start.
+    """
+
+    def __init__(self, params):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.my_nation = None
+        self.targets = []
+        self.error = None
+        self.events = []
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error")
+
+    def emit(self, event_type, **payload):
+        """Record a progress event and wake up any subscribers."""
+        with self._cond:
+            self.events.append({"type": event_type, **payload})
+            self._cond.notify_all()
+
+    def finish(self, status, error=None, **payload):
+        """Mark the job "done" or "error" and record the matching final event."""
+        with self._cond:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self.events.append({"type": status, **payload})
+            self._cond.notify_all()
+
+    def stream(self, heartbeat=HEARTBEAT_INTERVAL):
+        """
+        Yield events as they happen, starting from the first one.
+
+        Yields None every `heartbeat` seconds without new events so callers
+        can keep the connection alive. Ends after the job finishes.
+        """
+        index = 0
+        while True:
+            with self._cond:
+                if index >= len(self.events) and not self.finished:
+                    self._cond.wait(heartbeat)
+                new_events = self.events[index:]
+                index = len(self.events)
+                finished = self.finished
+            if not new_events and not finished:
+                yield None
+            for event in new_events:
+                yield event
+            if finished and index >= len(self.events):
+                return
+
+class JobManager:
+    """Run scans on a worker pool and keep their jobs around for a while."""
+
+    def __init__(self, workers=SCAN_WORKERS, ttl=JOB_TTL):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-worker")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+
+    def submit(self, scan, api_key, args, params):
+        """
+        Queue a scan.
+
+        Args:
+            scan: Callable run as scan(api_key, args, progress=job.emit) that
+                returns (my_nation, targets)
+            api_key: The Politics & War API key (not stored on the job)
+            args: Scan arguments
+            params: Scan parameters to show alongside the results
+
+        Returns:
+            The new ScanJob
+        """
+        self._prune()
+        job = ScanJob(params)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, scan, api_key, args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, scan, api_key, args):
+        job.status = "running"
+        job.emit("status", status="running")
+        try:
+            my_nation, targets = scan(api_key, args, progress=job.emit)
+            job.my_nation = my_nation
+            job.targets = targets
+            job.finish("done", count=len(targets))
+        except Exception as e:
+            if not isinstance(e, ValueError):
+                print(f"Error in scan job {job.id}: {str(e)}\n{traceback.format_exc()}")
+            job.finish("error", str(e), message=str(e))
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished_at > self.ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,91 @@
+import codecs
+import json
+import re
+
+CHUNK_SIZE = 16 * 1024  # Bytes read from the response at a time
+_WHITESPACE = " \t\n\r"
+
+class JSONArrayStream:
+    """
+    Decode the items of one JSON array inside a larger document, one at a time.
+
+    The document is read in chunks and each array item is decoded as soon as
+    it is complete (for numbers, once the delimiter after them has arrived), so only the current item (and one chunk) is held in
+    memory. Everything after the array is kept in `tail` once iteration ends.
+
+    If the array is never found (e.g. an error response), iteration yields
+    nothing and the whole document is parsed into `document` instead.
+
+    Parameters:
+    - chunks: Iterable of bytes, e.g. response.iter_content()
+    - start_pattern: Regex matching the text up to and including the array's "["
+    """
+
+    def __init__(self, chunks, start_pattern):
+        self._chunks = iter(chunks)
+        self._start = re.compile(start_pattern)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._exhausted = False
+        self.tail = ""
+        self.document = None
+        self.count = 0
+
+    def _read(self):
+        """Append the next chunk to the buffer. Returns False at the end of the document."""
+        if self._exhausted:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._exhausted = True
+            self._buffer += self._utf8.decode(b"", final=True)
+            return False
+        self._buffer += self._utf8.decode(chunk)
+        return True
+
+    def __iter__(self):
+        match = self._start.search(self._buffer)
+        while match is None:
+            if not self._read():
+                self.document = json.loads(self._buffer) if self._buffer.strip() else None
+                return
+            match = self._start.search(self._buffer)
+
+        pos = match.end()
+        while True:
+            # Skip to the next item or the end of the array
+            while True:
+                while pos < len(self._buffer) and self._buffer[pos] in _WHITESPACE + ",":
+                    pos += 1
+                if pos < len(self._buffer) or not self._read():
+                    break
+            if pos >= len(self._buffer):
+                raise ValueError("Response ended inside a JSON array")
+            if self._buffer[pos] == "]":
+                pos += 1
+                break
+
+            try:
+                item, end = self._decoder.raw_decode(self._buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely the item is cut off at the end of the buffer
+                if not self._read():
+                    raise ValueError("Response ended inside a JSON array item")
+                continue
+            if self._buffer[pos] not in '{["' and self._buffer[end:].lstrip(_WHITESPACE)[:1] not in (",", "]") \
+                    and self._read():
+                # A number may go on in the next chunk, decode it once a delimiter follows
+                continue
+
+            # Drop what has been decoded so the buffer stays around one chunk
+            self._buffer = self._buffer[end:]
+            pos = 0
+            self.count += 1
+            yield item
+
+        while self._read():
+            pass
+        self.tail = self._buffer[pos:]
+        self._buffer = ""
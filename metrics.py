@@ -0,0 +1,173 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Counters, with their Prometheus help text
+COUNTERS = {
+    "requests": "API requests sent (including retries)",
+    "rate_limited": "API responses with status 429",
+    "bytes_received": "Response body bytes received from the API (compressed, as sent)",
+    "nations_fetched": "Nations received in nation pages",
+    "nations_scanned": "Nations run through the scan filters",
+}
+
+# Stages, with their Prometheus help text
+STAGES = {
+    "rate_wait": "Waiting for the rate controller before a request",
+    "request": "HTTP round trip until the response arrived",
+    "decode": "JSON decoding of API responses",
+    "stream": "Downloading, decoding and filtering streamed pages",
+    "records": "Converting API nations to NationRecords",
+    "filter": "Running the target filters",
+    "scan": "Whole scans, from your nation to the final targets",
+    "render": "Rendering result pages",
+}
+
+class _Summary:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+class Metrics:
+    """
+    Thread-safe, process-wide scan instrumentation.
+
+    Keeps counters, per-stage durations (count, total and slowest) and page
+    sizes, plus references to caches whose hit rates are reported. Rendered
+    as Prometheus text for /metrics and as a plain summary for --stats.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._stages = {stage: _Summary() for stage in STAGES}
+        self._page_nations = _Summary()
+        self._caches = {}  # name -> TTLCache
+        self._gauges = {}  # name -> (help, callable)
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._stages[stage].add(seconds)
+
+    def observe_page(self, nations):
+        """Record the number of nations on a fetched page."""
+        with self._lock:
+            self._page_nations.add(nations)
+            self._counters["nations_fetched"] += nations
+
+    @contextmanager
+    def timed(self, stage):
+        """Time the enclosed block (or decorated function) as one run of stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def add_cache(self, name, cache):
+        """Report hits, misses and size of a TTLCache under name."""
+        self._caches[name] = cache
+
+    def add_gauge(self, name, help_text, read):
+        """Report read() as a gauge, read when metrics are rendered."""
+        self._gauges[name] = (help_text, read)
+
+    def snapshot(self):
+        """Current values as plain dictionaries."""
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {stage: (s.count, s.total, s.max) for stage, s in self._stages.items()}
+            pages = (self._page_nations.count, self._page_nations.total, self._page_nations.max)
+        scan_seconds = stages["scan"][1]
+        return {
+            "counters": counters,
+            "stages": stages,
+            "pages": pages,
+            "nations_per_second": counters["nations_scanned"] / scan_seconds if scan_seconds else 0.0,
+            "caches": {name: (cache.hits, cache.misses, len(cache)) for name, cache in self._caches.items()},
+            "gauges": {name: read() for name, (_, read) in self._gauges.items()},
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counters = dict.fromkeys(COUNTERS, 0)
+            self._stages = {stage: _Summary() for stage in STAGES}
+            self._page_nations = _Summary()
+
+    def prometheus(self):
+        """Render every metric in the Prometheus text exposition format."""
+        snap = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP pnw_{name} {help_text}")
+            lines.append(f"# TYPE pnw_{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}" if labels else ""
+                lines.append(f"pnw_{name}{suffix}{label_text} {value:g}")
+
+        for name, help_text in COUNTERS.items():
+            metric(f"{name}_total", "counter", help_text, [("", {}, snap["counters"][name])])
+
+        metric("stage_seconds", "summary", "Time spent per scan stage",
+               [sample for stage, (count, total, _) in snap["stages"].items()
+                for sample in (("_count", {"stage": stage}, count), ("_sum", {"stage": stage}, total))])
+        metric("stage_max_seconds", "gauge", "Slowest single run of each scan stage",
+               [("", {"stage": stage}, slowest) for stage, (_, _, slowest) in snap["stages"].items()])
+
+        count, total, largest = snap["pages"]
+        metric("page_nations", "summary", "Nations per fetched page",
+               [("_count", {}, count), ("_sum", {}, total)])
+        metric("page_nations_max", "gauge", "Most nations on one fetched page", [("", {}, largest)])
+        metric("scan_nations_per_second", "gauge", "Nations scanned per second of scan time",
+               [("", {}, snap["nations_per_second"])])
+
+        caches = snap["caches"].items()
+        metric("cache_hits_total", "counter", "Cache lookups answered from the cache",
+               [("", {"cache": name}, hits) for name, (hits, _, _) in caches])
+        metric("cache_misses_total", "counter", "Cache lookups that missed",
+               [("", {"cache": name}, misses) for name, (_, misses, _) in caches])
+        metric("cache_entries", "gauge", "Entries currently cached",
+               [("", {"cache": name}, size) for name, (_, _, size) in caches])
+
+        for name, (help_text, _) in self._gauges.items():
+            metric(name, "gauge", help_text, [("", {}, snap["gauges"][name])])
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Human-readable lines for --stats."""
+        snap = self.snapshot()
+        counters = snap["counters"]
+        lines = [
+            f"  API requests: {counters['requests']} ({counters['rate_limited']} rate limited), "
+            f"{counters['bytes_received'] / 1e6:,.2f} MB received",
+        ]
+        count, total, largest = snap["pages"]
+        if count:
+            lines.append(f"  Pages: {count}, {total / count:,.0f} nations on average (largest {largest:,.0f})")
+        lines.append(f"  Nations scanned: {counters['nations_scanned']:,} ({snap['nations_per_second']:,.0f}/s)")
+        for stage, (count, total, slowest) in snap["stages"].items():
+            if count:
+                lines.append(f"  {stage:<10} {total:8.3f}s over {count} run(s), slowest {slowest:.3f}s")
+        for name, (hits, misses, size) in snap["caches"].items():
+            if hits or misses:
+                lines.append(f"  Cache {name}: {hits / (hits + misses):.0%} hit rate ({hits} hits, {misses} misses, {size} cached)")
+        for name, value in snap["gauges"].items():
+            lines.append(f"  {name}: {value:g}")
+        return lines
+
+# Shared by the API client, the scans and the web app
+metrics = Metrics()
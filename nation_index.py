@@ -0,0 +1,114 @@
+import time
+import numpy as np
+from config import MIN_SCORE_RATIO, MAX_SCORE_RATIO
+
+class NationIndex:
+    """
+    Sorted in-memory index over decoded nations.
+
+    Nations are stored sorted by score, so a war range is one contiguous
+    slice found by binary search. Total infra and last_active are kept as
+    secondary sorted arrays, used when their range is more selective than
+    the score range.
+
+    Build once per dataset; the index does not change when nations do.
+    """
+
+    def __init__(self, records):
+        records = list(records)
+        scores = np.fromiter((n.score for n in records), np.float64, len(records))
+        order = np.argsort(scores, kind="stable")
+
+        self.records = [records[i] for i in order]
+        self.scores = scores[order]
+        self.infra = np.fromiter((n.total_infra for n in self.records), np.float64, len(self.records))
+        self.last_active = np.fromiter((n.last_active for n in self.records), np.float64, len(self.records))
+
+        # Secondary indexes: positions (into self.records) sorted by each column
+        self._infra_order = np.argsort(self.infra, kind="stable")
+        self._infra_sorted = self.infra[self._infra_order]
+        self._active_order = np.argsort(self.last_active, kind="stable")
+        self._active_sorted = self.last_active[self._active_order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def score_slice(self, min_score=None, max_score=None):
+        """Positions start:stop of nations with min_score <= score <= max_score."""
+        start = 0 if min_score is None else int(np.searchsorted(self.scores, min_score, side="left"))
+        stop = len(self.records) if max_score is None else int(np.searchsorted(self.scores, max_score, side="right"))
+        return start, max(start, stop)
+
+    def infra_positions(self, min_infra=None, max_infra=None):
+        """Positions of nations with min_infra <= total infra <= max_infra."""
+        return self._infra_order[self._sorted_range(self._infra_sorted, min_infra, max_infra)]
+
+    def active_positions(self, active_after=None, active_before=None):
+        """Positions of nations whose last_active (epoch seconds) falls in the range."""
+        return self._active_order[self._sorted_range(self._active_sorted, active_after, active_before)]
+
+    def query(self, min_score=None, max_score=None, min_infra=None, max_infra=None, active_before=None):
+        """
+        Nations inside every given range, in score order.
+
+        The range with the fewest nations (sizes are found by binary search)
+        is taken as the candidate set and the others are checked against it
+        with vectorized comparisons.
+
+        Parameters:
+        - min_score / max_score: Score range (inclusive)
+        - min_infra / max_infra: Total infra range (inclusive)
+        - active_before: Only nations last active at or before this epoch time
+
+        Returns:
+        - List of NationRecords
+        """
+        start, stop = self.score_slice(min_score, max_score)
+        infra_range = self._sorted_range(self._infra_sorted, min_infra, max_infra)
+        active_range = self._sorted_range(self._active_sorted, None, active_before)
+
+        sizes = {
+            "score": stop - start,
+            "infra": infra_range.stop - infra_range.start,
+            "active": active_range.stop - active_range.start
+        }
+        smallest = min(sizes, key=sizes.get)
+        if smallest == "score":
+            positions = np.arange(start, stop)
+        elif smallest == "infra":
+            positions = np.sort(self._infra_order[infra_range])
+        else:
+            positions = np.sort(self._active_order[active_range])
+
+        mask = (positions >= start) & (positions < stop)
+        if min_infra is not None:
+            mask &= self.infra[positions] >= min_infra
+        if max_infra is not None:
+            mask &= self.infra[positions] <= max_infra
+        if active_before is not None:
+            mask &= self.last_active[positions] <= active_before
+
+        return [self.records[i] for i in positions[mask]]
+
+    def war_range(self, my_nation, **ranges):
+        """Nations inside my_nation's war range (and any extra query ranges)."""
+        score = float(my_nation["score"])
+        return self.query(score * MIN_SCORE_RATIO, score * MAX_SCORE_RATIO, **ranges)
+
+    def candidates(self, my_nation, min_infra=None, max_infra=None, min_inactive_days=None, now=None):
+        """
+        Nations that can pass filter_targets for my_nation.
+
+        A superset of the matches: the war range, infra range and inactivity
+        threshold are applied, the remaining criteria are left to the filter.
+        """
+        active_before = None
+        if min_inactive_days is not None:
+            active_before = (time.time() if now is None else now) - min_inactive_days * 86400
+        return self.war_range(my_nation, min_infra=min_infra, max_infra=max_infra, active_before=active_before)
+
+    @staticmethod
+    def _sorted_range(values, low=None, high=None):
+        start = 0 if low is None else int(np.searchsorted(values, low, side="left"))
+        stop = len(values) if high is None else int(np.searchsorted(values, high, side="right"))
+        return slice(start, max(start, stop))
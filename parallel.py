@@ -0,0 +1,143 @@
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from columnar import match_mask, build_results
+from config import MAX_SOLDIER_RATIO
+
+PARALLEL_WORKERS = int(os.getenv("PNW_PARALLEL_WORKERS", str(os.cpu_count() or 1)))  # Filter processes
+PARALLEL_MIN_NATIONS = int(os.getenv("PNW_PARALLEL_MIN_NATIONS", "50000"))  # Smaller datasets stay in-process
+SHARDS_PER_WORKER = 2  # More shards than workers evens out uneven shards
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def get_pool(workers):
+    """Process pool shared by all parallel filters, started on first use."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Pool workers share the parent's resource tracker, which already knows the block
+        return shared_memory.SharedMemory(name=name)
+
+class SharedColumns:
+    """
+    Copy of the numeric nation columns in shared memory.
+
+    Worker processes attach by name (see `spec`) and get NumPy views
+    without copying or pickling the data. Use as a context manager so the
+    blocks are released afterwards.
+    """
+
+    def __init__(self, columns):
+        self._blocks = []
+        self.spec = {}
+        for name, values in columns.items():
+            if name == "rows":
+                continue
+            values = np.ascontiguousarray(values)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, values.nbytes))
+            self._blocks.append(shm)
+            np.ndarray(values.shape, values.dtype, buffer=shm.buf)[:] = values
+            self.spec[name] = (shm.name, values.dtype.str, len(values))
+
+    def close(self):
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _best_indices(columns, mask, k):
+    """Matching row indices, highest infra first (ties by index), at most k."""
+    indices = np.flatnonzero(mask)
+    order = np.lexsort((indices, -columns["infra"][indices]))
+    return indices[order[:k] if k is not None else order]
+
+def _filter_shard(spec, start, stop, queries, k, now):
+    """Worker: run every query over rows start:stop and return each query's best row indices."""
+    blocks = [_attach(name) for name, _, _ in spec.values()]
+    try:
+        columns = {
+            column: np.ndarray((count,), np.dtype(dtype), buffer=shm.buf)[start:stop]
+            for shm, (column, (_, dtype, count)) in zip(blocks, spec.items())
+        }
+        results = []
+        for my_nation, criteria in queries:
+            mask = match_mask(columns, my_nation, now=now, **criteria)
+            results.append((_best_indices(columns, mask, k) + start).tolist())
+        # Views must be gone before the blocks can be closed
+        del columns, mask
+        return results
+    finally:
+        for shm in blocks:
+            shm.close()
+
+def filter_many(columns, queries, limit=None, workers=PARALLEL_WORKERS, min_nations=PARALLEL_MIN_NATIONS):
+    """
+    Run several filter queries over the same columns, sharded across processes.
+
+    Each worker filters and ranks its shard for every query and returns its
+    top `limit` rows; the shards are then merged per query. Datasets smaller
+    than `min_nations` (or workers <= 1) are filtered in this process.
+
+    Parameters:
+    - columns: Dictionary in the columnar.to_columns format
+    - queries: List of (my_nation, criteria) pairs, criteria being
+      columnar.match_mask keyword arguments
+    - limit: Most targets per query (None for all)
+    - workers: Number of worker processes
+    - min_nations: Smallest dataset worth sending to the pool
+
+    Returns:
+    - One list of targets per query, sorted by infrastructure
+    """
+    now = time.time()
+    count = len(columns["rows"])
+
+    if workers <= 1 or count < min_nations:
+        per_query = [_best_indices(columns, match_mask(columns, my_nation, now=now, **criteria), limit)
+                     for my_nation, criteria in queries]
+    else:
+        print(f"Filtering {count:,} nations for {len(queries)} query(s) across {workers} processes...")
+        shards = workers * SHARDS_PER_WORKER
+        bounds = np.linspace(0, count, shards + 1, dtype=np.int64)
+        with SharedColumns(columns) as shared:
+            futures = [get_pool(workers).submit(_filter_shard, shared.spec, int(start), int(stop), queries, limit, now)
+                       for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+            shard_results = [future.result() for future in futures]
+
+        # Merge: shard winners in row order, then the same ranking again
+        per_query = []
+        for q in range(len(queries)):
+            indices = np.array(sorted(i for shard in shard_results for i in shard[q]), dtype=np.int64)
+            order = np.argsort(-columns["infra"][indices], kind="stable")
+            per_query.append(indices[order[:limit] if limit is not None else order])
+
+    return [build_results(columns, indices, my_nation, max_soldier_ratio=criteria.get("max_soldier_ratio", MAX_SOLDIER_RATIO),
+                          check_wars=criteria.get("check_wars", True), now=now)
+            for indices, (my_nation, criteria) in zip(per_query, queries)]
@@ -1,10 +1,148 @@
+import hashlib
+import json
+import math
+import re
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
 import os
+from ratelimit import rate_controller
+from cache import TTLCache, SingleFlight
+from jsonstream import JSONArrayStream, CHUNK_SIZE as STREAM_CHUNK_SIZE
+from records import NationRecord
+from metrics import metrics
 # Removed: from config import API_KEY - API key will be passed as parameter
 
-# Removed: API_URL = f"https://api.politicsandwar.com/graphql?api_key={API_KEY}" - URL will be built in run_query
-RATE_LIMIT_DELAY = 1  # 1 second delay between requests
+API_URL = "https://api.politicsandwar.com/graphql"  # API key is sent as a query parameter per request
+CONNECT_TIMEOUT = float(os.getenv("PNW_CONNECT_TIMEOUT", "5"))  # Seconds to establish a connection
+READ_TIMEOUT = float(os.getenv("PNW_READ_TIMEOUT", "30"))  # Seconds to wait for a response (500-nation pages are large)
+POOL_SIZE = int(os.getenv("PNW_POOL_SIZE", "10"))  # Keep-alive connections kept open to the API
+NATION_CACHE_TTL = int(os.getenv("PNW_NATION_CACHE_TTL", "120"))  # Seconds a fetched nation page is reused
+NATION_CACHE_SIZE = int(os.getenv("PNW_NATION_CACHE_SIZE", "200"))  # Nation pages kept in memory
+MY_NATION_TTL = int(os.getenv("PNW_MY_NATION_TTL", "60"))  # Seconds your nation's score/soldiers/spies are reused
+TREATY_TTL = int(os.getenv("PNW_TREATY_TTL", "1800"))  # Seconds your alliance and its treaties are reused
+MY_NATION_CACHE_SIZE = 500  # API keys whose nation is kept in memory
+ALLIANCE_TREATY_CACHE_SIZE = 2000  # Alliances whose treaty list is kept for allies-of-allies lookups
+RATE_LIMIT_MAX_RETRIES = 4  # Retries after a 429 before giving up
+PREFETCH_DEPTH = 3  # Pages fetched ahead of the page being filtered
+PREFETCH_WORKERS = 2  # Concurrent page fetchers (request starts are paced by the rate controller)
+BATCH_MAX_PAGES = 1  # Most pages fetched per request via aliased nations() selections (1 disables batching)
+BATCH_TARGET_SECONDS = 10  # Batches taking longer than this shrink
+NATIONS_ARRAY_START = r'"nations"\s*:\s*\{\s*"data"\s*:\s*\['  # Where stream_nations starts decoding
+
+_session = None
+_session_lock = threading.Lock()
+
+# Nation pages are public and identical for every user, so one process-wide
+# cache keyed by the query (never the API key) serves all scans
+nation_cache = TTLCache(NATION_CACHE_SIZE, NATION_CACHE_TTL)
+# Concurrent scans asking for the same page share one in-flight request
+nation_flights = SingleFlight()
+# Your own nation, keyed by a hash of the API key. Stats change every turn,
+# the alliance and its treaties rarely, so they expire separately
+my_nation_cache = TTLCache(MY_NATION_CACHE_SIZE, MY_NATION_TTL)
+treaty_cache = TTLCache(MY_NATION_CACHE_SIZE, TREATY_TTL)
+# Treaty lists of other alliances, shared by all users like nation pages
+alliance_treaty_cache = TTLCache(ALLIANCE_TREATY_CACHE_SIZE, TREATY_TTL)
+_NOT_CACHED = object()
+
+metrics.add_cache("nations", nation_cache)
+metrics.add_cache("my_nation", my_nation_cache)
+metrics.add_cache("treaties", treaty_cache)
+metrics.add_cache("alliance_treaties", alliance_treaty_cache)
+metrics.add_gauge("singleflight_shared", "Page requests answered by another caller's in-flight request",
+                  lambda: nation_flights.shared)
+metrics.add_gauge("request_rate", "Requests per second currently allowed by the rate controller",
+                  lambda: rate_controller.rate)
+
+# Treaty types that prevent raiding
+PROTECTED_TREATY_TYPES = frozenset(['MDP', 'MDOAP', 'ODP', 'ODOAP', 'NAP', 'PIAT', 'Protectorate'])
+
+def get_session():
+    """
+    Get the HTTP session shared by all API requests.
+
+    The session keeps connections to the API alive between requests, so pages
+    after the first skip the TCP and TLS handshakes. It is shared by CLI scans
+    and Flask request threads alike.
+
+    Returns:
+        requests.Session with a pooled adapter and compression enabled
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.headers.update({
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive"
+            })
+            _session = session
+        return _session
+
+def _post(api_key: str, query: str, stream=False):
+    """
+    Send a GraphQL query, waiting out rate limits, and check the HTTP status.
+
+    Returns:
+        The successful requests.Response (with stream=True the body is not read yet)
+    """
+    # Check if API key is provided
+    if not api_key:
+        raise ValueError("API_KEY is not provided. Please enter your Politics & War API key.")
+
+    session = get_session()
+
+    attempt = 0
+    while True:
+        with metrics.timed("rate_wait"):
+            rate_controller.acquire()  # Wait only if the shared budget is spent
+        with metrics.timed("request"):
+            response = session.post(
+                API_URL,
+                params={"api_key": api_key},
+                json={"query": query},
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                stream=stream
+            )
+        metrics.inc("requests")
+        if response.status_code != 429:  # Too Many Requests
+            break
+        metrics.inc("rate_limited")
+        response.close()
+        if attempt >= RATE_LIMIT_MAX_RETRIES:
+            raise ValueError(f"Rate limit retry failed after {attempt} retries (status code 429)")
+        delay = rate_controller.on_rate_limited(attempt, response.headers)
+        print(f"Rate limit hit, retrying in {delay:.1f}s (now {rate_controller.rate:.2f} req/s)...")
+        time.sleep(delay)
+        attempt += 1
+
+    # Handle specific HTTP error codes
+    if response.status_code != 200:
+        response.close()
+    if response.status_code == 401:
+        raise ValueError("API authentication failed. Check your API key.")
+    elif response.status_code == 403:
+        raise ValueError("API access forbidden. Your key may be invalid or lacks permissions.")
+    elif response.status_code != 200:
+        raise ValueError(f"API request failed with status code {response.status_code}")
+
+    rate_controller.on_success(response.headers)
+    return response
+
+def _wire_bytes(response):
+    """Body bytes read off the connection so far, before gzip decoding."""
+    return response.raw.tell()
+
+def _raise_graphql_errors(data):
+    if "errors" in data:
+        error_messages = [error.get("message", "Unknown GraphQL error") for error in data.get("errors", [])]
+        error_message = "; ".join(error_messages)
+        print(f"GraphQL API Error: {error_message}")
+        raise ValueError(f"GraphQL API Error: {error_message}")
 
 def run_query(api_key: str, query: str):
     """
@@ -20,39 +158,16 @@ def run_query(api_key: str, query: str):
     Raises:
         ValueError: If there is an API error, authentication error, or invalid response
     """
-    # Check if API key is provided
-    if not api_key:
-        raise ValueError("API_KEY is not provided. Please enter your Politics & War API key.")
-
-    API_URL = f"https://api.politicsandwar.com/graphql?api_key={api_key}"
-
     try:
-        time.sleep(RATE_LIMIT_DELAY)  # Add delay between requests
-        response = requests.post(API_URL, json={"query": query})
-
-        # Handle specific HTTP error codes
-        if response.status_code == 401:
-            raise ValueError("API authentication failed. Check your API key.")
-        elif response.status_code == 403:
-            raise ValueError("API access forbidden. Your key may be invalid or lacks permissions.")
-        elif response.status_code == 429:  # Too Many Requests
-            print("Rate limit hit, waiting to retry...")
-            time.sleep(5)  # Wait longer if we hit the rate limit
-            response = requests.post(API_URL, json={"query": query})
-            if response.status_code != 200:
-                raise ValueError(f"Rate limit retry failed with status code {response.status_code}")
-        elif response.status_code != 200:
-            raise ValueError(f"API request failed with status code {response.status_code}")
+        response = _post(api_key, query)
 
         # Parse response as JSON
-        data = response.json()
+        with metrics.timed("decode"):
+            data = response.json()
+        metrics.inc("bytes_received", _wire_bytes(response))
 
         # Check for GraphQL errors
-        if "errors" in data:
-            error_messages = [error.get("message", "Unknown GraphQL error") for error in data.get("errors", [])]
-            error_message = "; ".join(error_messages)
-            print(f"GraphQL API Error: {error_message}")
-            raise ValueError(f"GraphQL API Error: {error_message}")
+        _raise_graphql_errors(data)
 
         # Validate response structure
         if "data" not in data:
@@ -72,27 +187,16 @@ def run_query(api_key: str, query: str):
         print(f"Unexpected error in API query: {str(e)}")
         raise ValueError(f"API query failed: {str(e)}")
 
-def get_my_nation(api_key: str):
-    """
-    Get information about the currently authenticated nation.
-
-    Args:
-        api_key: The Politics & War API key.
-
-    Returns:
-        Nation data dictionary
-
-    Raises:
-        ValueError: If authentication fails or the API returns an error
-    """
-    query = """
-    {
-      me {
-        nation {
+MY_NATION_STATS_FIELDS = """
           id
+          nation_name
           score
           soldiers
           spies
+          alliance_id
+"""
+
+MY_NATION_ALLIANCE_FIELDS = """
           alliance {
             id
             name
@@ -103,9 +207,70 @@ def get_my_nation(api_key: str):
               treaty_url
             }
           }
-        }
-      }
-    }
+"""
+
+def api_key_hash(api_key: str):
+    """Cache key for per-user data, so API keys are never kept in memory as keys."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+def get_my_nation(api_key: str, use_cache=True):
+    """
+    Get information about the currently authenticated nation.
+
+    Stats are cached for MY_NATION_TTL seconds and the alliance with its
+    treaties for TREATY_TTL seconds. While only the stats are stale, a
+    smaller query without the treaty list refreshes them.
+
+    Args:
+        api_key: The Politics & War API key.
+        use_cache: Whether cached data may be returned
+
+    Returns:
+        Nation data dictionary
+
+    Raises:
+        ValueError: If authentication fails or the API returns an error
+    """
+    key = api_key_hash(api_key)
+    stats = my_nation_cache.get(key) if use_cache else None
+    alliance = treaty_cache.get(key, _NOT_CACHED) if use_cache else _NOT_CACHED
+
+    if stats is not None and alliance is not _NOT_CACHED:
+        print("Using cached nation data")
+        return {**stats, "alliance": alliance}
+
+    if alliance is not _NOT_CACHED:
+        stats = _query_my_nation(api_key, MY_NATION_STATS_FIELDS)
+        # Only reuse the cached alliance if the nation is still in it
+        if int(stats.get("alliance_id") or 0) == int((alliance or {}).get("id") or 0):
+            my_nation_cache.set(key, stats)
+            return {**stats, "alliance": alliance}
+
+    nation = _query_my_nation(api_key, MY_NATION_STATS_FIELDS + MY_NATION_ALLIANCE_FIELDS)
+    my_nation_cache.set(key, {k: v for k, v in nation.items() if k != "alliance"})
+    treaty_cache.set(key, nation.get("alliance"))
+    return nation
+
+def invalidate_my_nation(api_key: str, treaties=True):
+    """
+    Drop cached data for the nation behind an API key.
+
+    Args:
+        api_key: The Politics & War API key.
+        treaties: Also drop the cached alliance and treaties
+    """
+    key = api_key_hash(api_key)
+    my_nation_cache.delete(key)
+    if treaties:
+        treaty_cache.delete(key)
+
+def _query_my_nation(api_key, fields):
+    query = f"""
+    {{
+      me {{
+        nation {{{fields}        }}
+      }}
+    }}
     """
     # Run the query with already enhanced error handling
     data = run_query(api_key, query)
@@ -120,59 +285,145 @@ def get_my_nation(api_key: str):
 
     return data["data"]["me"]["nation"]
 
-def get_nations(api_key: str, page=1):
+def format_nation_args(filters=None):
     """
-    Get a list of nations from the Politics & War API.
+    Translate a nation filter spec into extra GraphQL nations() arguments.
 
     Args:
-        api_key: The Politics & War API key.
-        page: Page number for pagination
+        filters: Dictionary with any of id, min_score, max_score, vmode, color,
+            alliance_id and order_by (a (column, direction) tuple)
 
     Returns:
-        Dictionary containing nation data and pagination info
-
-    Raises:
-        ValueError: If the API returns an error or unexpected response structure
+        String of arguments starting with ", " (empty if there are no filters)
     """
-    query = f"""
-    {{
-      nations(page: {page}, first: 500) {{
+    if not filters:
+        return ""
+
+    args = []
+    if filters.get("id"):
+        args.append(f"id: [{', '.join(str(int(i)) for i in filters['id'])}]")
+    # Round the score range outwards so rounding never drops a nation in range
+    if filters.get("min_score") is not None:
+        args.append(f"min_score: {math.floor(filters['min_score'] * 100) / 100}")
+    if filters.get("max_score") is not None:
+        args.append(f"max_score: {math.ceil(filters['max_score'] * 100) / 100}")
+    if filters.get("vmode") is not None:
+        args.append(f"vmode: {'true' if filters['vmode'] else 'false'}")
+    if filters.get("color"):
+        args.append(f"color: [{', '.join(json.dumps(color) for color in filters['color'])}]")
+    if filters.get("alliance_id") is not None:
+        args.append(f"alliance_id: [{', '.join(str(int(a)) for a in filters['alliance_id'])}]")
+    if filters.get("order_by"):
+        column, order = filters["order_by"]
+        args.append(f"orderBy: {{column: {column}, order: {order}}}")
+
+    return ", " + ", ".join(args)
+
+# Full nation selection, as stored in snapshots and used by unfiltered scans.
+# Nested selections are (field, [subfields]) tuples.
+NATION_FIELDS = [
+    "id", "nation_name", "score", "last_active", "alliance_id", "soldiers", "spies",
+    "vacation_mode_turns", "color",
+    ("alliance", ["id", "name"]),
+    ("cities", ["infrastructure"]),
+    ("wars", ["turnsleft", "date", "def_id"]),
+    "war_policy",
+    ("defensive_wars", ["id", "turnsleft", "def_id"])
+]
+
+def format_fields(fields, indent=0):
+    """Render a field selection list as indented GraphQL."""
+    pad = " " * indent
+    lines = []
+    for field in fields:
+        if isinstance(field, tuple):
+            name, subfields = field
+            lines.append(f"{pad}{name} {{")
+            lines.append(format_fields(subfields, indent + 2))
+            lines.append(f"{pad}}}")
+        else:
+            lines.append(f"{pad}{field}")
+    return "\n".join(lines)
+
+def _nations_selection(page, filters=None, fields=None, alias=None):
+    prefix = f"{alias}: " if alias else ""
+    return f"""
+      {prefix}nations(page: {page}, first: 500{format_nation_args(filters)}) {{
         data {{
-          id
-          nation_name
-          score
-          last_active
-          alliance_id
-          soldiers
-          spies
-          vacation_mode_turns
-          color
-          alliance {{
-            id
-            name
-          }}
-          cities {{
-            infrastructure
-          }}
-          wars {{
-            turnsleft
-            date
-            def_id
-          }}
-          war_policy
-          defensive_wars {{
-            id
-            turnsleft
-            def_id
-          }}
+{format_fields(fields or NATION_FIELDS, 10)}
         }}
         paginatorInfo {{
           hasMorePages
           currentPage
         }}
-      }}
+      }}"""
+
+def build_nations_query(page=1, filters=None, fields=None):
+    """
+    Build the GraphQL query for one page of nations.
+
+    Args:
+        page: Page number for pagination
+        filters: Optional server-side filter spec, see format_nation_args
+        fields: Field selection to request (default: NATION_FIELDS)
+
+    Returns:
+        GraphQL query string
+    """
+    return f"""
+    {{{_nations_selection(page, filters, fields)}
+    }}
+    """
+
+def build_nations_batch_query(pages, filters=None, fields=None):
+    """
+    Build one GraphQL query fetching several pages of nations.
+
+    Each page is an aliased nations() selection named page_<n>.
+
+    Args:
+        pages: Page numbers to fetch
+        filters: Optional server-side filter spec, see format_nation_args
+        fields: Field selection to request (default: NATION_FIELDS)
+
+    Returns:
+        GraphQL query string
+    """
+    selections = "".join(_nations_selection(page, filters, fields, alias=f"page_{page}") for page in pages)
+    return f"""
+    {{{selections}
     }}
     """
+
+def get_nations(api_key: str, page=1, filters=None, fields=None, use_cache=True):
+    """
+    Get a list of nations from the Politics & War API.
+
+    Pages are served from the shared nation cache when a fresh copy exists.
+
+    Args:
+        api_key: The Politics & War API key.
+        page: Page number for pagination
+        filters: Optional server-side filter spec, see format_nation_args
+        fields: Field selection to request (default: NATION_FIELDS)
+        use_cache: Set to False to always fetch (the result is still cached)
+
+    Returns:
+        Dictionary containing nation data and pagination info
+
+    Raises:
+        ValueError: If the API returns an error or unexpected response structure
+    """
+    query = build_nations_query(page, filters, fields)
+    if use_cache:
+        cached = nation_cache.get(query)
+        if cached is not None:
+            print(f"Using cached nations (page {page})")
+            return cached
+
+    return nation_flights.do(query, lambda: _fetch_nations(api_key, page, query))
+
+def _fetch_nations(api_key, page, query):
     # Run the query - error handling happens in run_query function
     data = run_query(api_key, query)
 
@@ -186,14 +437,207 @@ def get_nations(api_key: str, page=1):
 
     # Log success and nation count
     nation_count = len(data["data"]["nations"]["data"])
+    metrics.observe_page(nation_count)
     print(f"Successfully fetched {nation_count} nations from API (page {page})")
 
+    nation_cache.set(query, data["data"]["nations"])
     return data["data"]["nations"]
 
+class NationStream:
+    """
+    One page of nations, decoded from the response while it downloads.
+
+    Iterating yields NationRecords one at a time (rows that cannot be
+    decoded are skipped), without the page ever being held in memory.
+    After iteration, `has_more` and `count` describe the page.
+    """
+
+    def __init__(self, api_key: str, page=1, filters=None, fields=None):
+        self.api_key = api_key
+        self.page = page
+        self.query = build_nations_query(page, filters, fields)
+        self.has_more = False
+        self.count = 0
+
+    def __iter__(self):
+        started = time.perf_counter()
+        try:
+            response = _post(self.api_key, self.query, stream=True)
+        except requests.exceptions.RequestException as e:
+            print(f"Network error communicating with the API: {str(e)}")
+            raise ValueError(f"Network error: {str(e)}")
+
+        with response:
+            try:
+                items = JSONArrayStream(response.iter_content(STREAM_CHUNK_SIZE), NATIONS_ARRAY_START)
+                for n in items:
+                    self.count += 1
+                    try:
+                        yield NationRecord.from_api(n)
+                    except (KeyError, TypeError, ValueError):
+                        continue
+            except requests.exceptions.RequestException as e:
+                print(f"Network error communicating with the API: {str(e)}")
+                raise ValueError(f"Network error: {str(e)}")
+            finally:
+                metrics.inc("bytes_received", _wire_bytes(response))
+
+        if items.document is not None:
+            # No nations array, so this is an error response
+            _raise_graphql_errors(items.document)
+            raise ValueError("API response missing nation data")
+        if '"errors"' in items.tail:
+            # Errors reported after the data, the tail is only the end of the document
+            messages = re.findall(r'"message"\s*:\s*"((?:[^"\\]|\\.)*)"', items.tail)
+            _raise_graphql_errors({"errors": [{"message": m} for m in messages] or [{}]})
+        self.has_more = bool(re.search(r'"hasMorePages"\s*:\s*true', items.tail))
+        metrics.observe_page(self.count)
+        # Includes the time the caller spent filtering, the two are interleaved
+        metrics.observe("stream", time.perf_counter() - started)
+        print(f"Successfully streamed {self.count} nations from API (page {self.page})")
+
+def stream_nations(api_key: str, page=1, filters=None, fields=None):
+    """
+    Stream one page of nations from the Politics & War API.
+
+    Unlike get_nations, the page bypasses the nation cache and is decoded
+    while it downloads, so memory use stays at one nation at a time.
+
+    Args:
+        api_key: The Politics & War API key.
+        page: Page number for pagination
+        filters: Optional server-side filter spec, see format_nation_args
+        fields: Field selection to request (default: NATION_FIELDS)
+
+    Returns:
+        NationStream - iterate it for NationRecords, then read has_more
+
+    Raises:
+        ValueError: While iterating, if the API returns an error
+    """
+    return NationStream(api_key, page, filters, fields)
+
+def get_recent_wars(api_key: str, page=1):
+    """
+    Get one page of wars, newest first.
+
+    Args:
+        api_key: The Politics & War API key.
+        page: Page number to fetch (500 wars per page)
+
+    Returns:
+        Dictionary with "data" (wars with id, date, att_id and def_id) and "paginatorInfo"
+
+    Raises:
+        ValueError: If the API returns an error
+    """
+    query = f"""
+    {{
+      wars(page: {page}, first: 500, orderBy: {{column: ID, order: DESC}}) {{
+        data {{
+          id
+          date
+          att_id
+          def_id
+        }}
+        paginatorInfo {{
+          hasMorePages
+        }}
+      }}
+    }}
+    """
+    data = run_query(api_key, query)
+    if "data" not in data or "wars" not in data["data"]:
+        raise ValueError("API response missing 'wars' field")
+    return data["data"]["wars"]
+
+def get_nations_batch(api_key: str, pages, filters=None, fields=None, use_cache=True):
+    """
+    Get several pages of nations in a single API request.
+
+    Pages with a fresh copy in the shared nation cache are left out of the request.
+
+    Args:
+        api_key: The Politics & War API key.
+        pages: Page numbers to fetch
+        filters: Optional server-side filter spec, see format_nation_args
+        fields: Field selection to request (default: NATION_FIELDS)
+        use_cache: Set to False to always fetch (the results are still cached)
+
+    Returns:
+        Dictionary mapping each page number to the same structure get_nations returns
+
+    Raises:
+        ValueError: If the API returns an error or unexpected response structure
+    """
+    results = {}
+    queries = {page: build_nations_query(page, filters, fields) for page in pages}
+    if use_cache:
+        for page in pages:
+            cached = nation_cache.get(queries[page])
+            if cached is not None:
+                results[page] = cached
+        if results:
+            print(f"Using cached nations (pages {', '.join(str(page) for page in results)})")
+    missing = [page for page in pages if page not in results]
+    if not missing:
+        return results
+
+    batch_query = build_nations_batch_query(missing, filters, fields)
+    results.update(nation_flights.do(batch_query, lambda: _fetch_nations_batch(api_key, missing, queries, batch_query)))
+    return results
+
+def _fetch_nations_batch(api_key, pages, queries, batch_query):
+    data = run_query(api_key, batch_query)
+
+    results = {}
+    for page in pages:
+        nations_data = data["data"].get(f"page_{page}")
+        if not nations_data or "data" not in nations_data:
+            raise ValueError(f"API response missing nation data for page {page}")
+        results[page] = nations_data
+        metrics.observe_page(len(nations_data["data"]))
+        nation_cache.set(queries[page], nations_data)
+
+    nation_count = sum(len(nations_data["data"]) for nations_data in results.values())
+    print(f"Successfully fetched {nation_count} nations from API (pages {pages[0]}-{pages[-1]})")
+
+    return results
+
+class BatchSizer:
+    """
+    Pick how many pages to fetch per request from observed response times.
+
+    The batch grows by one page while requests finish well within
+    BATCH_TARGET_SECONDS and halves when a request is slow or fails (for
+    example because the API rejects the query as too complex).
+    """
+
+    def __init__(self, max_size=BATCH_MAX_PAGES, target_seconds=BATCH_TARGET_SECONDS):
+        self._lock = threading.Lock()
+        self.max_size = max(1, max_size)
+        self.target_seconds = target_seconds
+        self.size = 1
+
+    def next_size(self):
+        with self._lock:
+            return self.size
+
+    def record(self, pages, elapsed, ok=True):
+        """Adjust the batch size after a request for `pages` pages took `elapsed` seconds."""
+        with self._lock:
+            if not ok or elapsed > self.target_seconds:
+                self.size = max(1, self.size // 2)
+            elif elapsed < self.target_seconds / 2 and pages >= self.size:
+                self.size = min(self.max_size, self.size + 1)
+
 def has_treaty(my_alliance, target_alliance, protected_types=None):
     """
     Check if two alliances have a treaty that should prevent raiding.
 
+    For checking many nations, build the set once with
+    protected_alliance_ids and test membership instead.
+
     Args:
         my_alliance: Alliance data for your nation
         target_alliance: Alliance data for target nation
@@ -202,18 +646,228 @@ def has_treaty(my_alliance, target_alliance, protected_types=None):
     Returns:
         Boolean indicating if a treaty exists
     """
-    if not protected_types:
-        # Default treaty types that should prevent raiding
-        protected_types = ['MDP', 'MDOAP', 'ODP', 'ODOAP', 'NAP', 'PIAT', 'Protectorate']
-
     if not my_alliance or not target_alliance:
         return False
 
-    # Check both alliances' treaties
-    for treaty in my_alliance.get('treaties', []):
-        if (treaty['alliance1_id'] == target_alliance['id'] or
-            treaty['alliance2_id'] == target_alliance['id']):
-            if treaty['treaty_type'] in protected_types:
-                return True
+    return int(target_alliance['id']) in protected_alliance_ids(my_alliance, protected_types)
+
+def treaty_partners(alliance_id, treaties, protected_types=None):
+    """
+    IDs of the alliances on the other side of an alliance's protected treaties.
+
+    Args:
+        alliance_id: ID of the alliance the treaties belong to
+        treaties: Treaty list as returned by the API
+        protected_types: Treaty types that count (default PROTECTED_TREATY_TYPES)
+
+    Returns:
+        Set of alliance IDs (ints)
+    """
+    protected_types = PROTECTED_TREATY_TYPES if protected_types is None else frozenset(protected_types)
+    alliance_id = int(alliance_id)
+    partners = set()
+    for treaty in treaties or []:
+        if treaty['treaty_type'] not in protected_types:
+            continue
+        for side in (int(treaty['alliance1_id']), int(treaty['alliance2_id'])):
+            if side != alliance_id:
+                partners.add(side)
+    return partners
+
+def protected_alliance_ids(my_alliance, protected_types=None):
+    """
+    Alliances that must not be raided: your own and its direct treaty partners.
+
+    Args:
+        my_alliance: Alliance data for your nation (with treaties), or None
+        protected_types: Treaty types that prevent raiding (default PROTECTED_TREATY_TYPES)
+
+    Returns:
+        Set of alliance IDs (ints), empty if you have no alliance
+    """
+    if not my_alliance:
+        return set()
+    protected = treaty_partners(my_alliance['id'], my_alliance.get('treaties'), protected_types)
+    protected.add(int(my_alliance['id']))
+    return protected
+
+def get_alliance_treaties(api_key: str, alliance_ids):
+    """
+    Get the treaty lists of several alliances.
+
+    Args:
+        api_key: The Politics & War API key.
+        alliance_ids: Alliance IDs to look up
+
+    Returns:
+        Dictionary mapping alliance ID (int) to its treaty list
+    """
+    results, missing = {}, []
+    for alliance_id in sorted(set(int(a) for a in alliance_ids)):
+        cached = alliance_treaty_cache.get(alliance_id)
+        if cached is not None:
+            results[alliance_id] = cached
+        else:
+            missing.append(alliance_id)
+
+    # Alliances are looked up 500 at a time, the most one page returns
+    for start in range(0, len(missing), 500):
+        chunk = missing[start:start + 500]
+        query = f"""
+        {{
+          alliances(id: [{", ".join(str(a) for a in chunk)}], first: 500) {{
+            data {{
+              id
+              treaties {{
+                alliance1_id
+                alliance2_id
+                treaty_type
+              }}
+            }}
+          }}
+        }}
+        """
+        data = run_query(api_key, query)
+        if "data" not in data or "alliances" not in data["data"]:
+            raise ValueError("API response missing 'alliances' field")
+
+        for alliance in data["data"]["alliances"]["data"]:
+            treaties = alliance.get("treaties") or []
+            results[int(alliance["id"])] = treaties
+            alliance_treaty_cache.set(int(alliance["id"]), treaties)
+        # Alliances the API did not return (e.g. disbanded) have no treaties
+        for alliance_id in chunk:
+            results.setdefault(alliance_id, [])
+
+    return results
+
+def expand_protected_alliances(api_key: str, my_alliance, protected_types=None, hops=1):
+    """
+    Protected alliance IDs, followed through the treaty graph.
+
+    hops=1 is your alliance and its direct treaty partners (no API calls),
+    hops=2 adds their partners (allies of allies), and so on. Treaty lists of
+    other alliances come from alliance_treaty_cache when possible.
+
+    Args:
+        api_key: The Politics & War API key.
+        my_alliance: Alliance data for your nation (with treaties), or None
+        protected_types: Treaty types that prevent raiding (default PROTECTED_TREATY_TYPES)
+        hops: How many treaty links to follow from your alliance
+
+    Returns:
+        Set of alliance IDs (ints)
+    """
+    protected = protected_alliance_ids(my_alliance, protected_types)
+    frontier = protected - {int(my_alliance['id'])} if my_alliance else set()
+
+    for _ in range(1, hops):
+        if not frontier:
+            break
+        treaties = get_alliance_treaties(api_key, frontier)
+        frontier = set()
+        for alliance_id, alliance_treaties in treaties.items():
+            frontier |= treaty_partners(alliance_id, alliance_treaties, protected_types) - protected
+        protected |= frontier
+
+    return protected
+
+class PagePrefetcher:
+    """
+    Fetch nation pages ahead of the consumer on background threads.
+
+    Up to `depth` pages (or batches of pages) are in flight or waiting to be
+    consumed at any time. With batch_pages > 1 each request fetches several
+    consecutive pages, sized by a BatchSizer. Iterating yields
+    (page, nations_data, error) tuples in page order, where exactly one of
+    nations_data and error is set. Iteration ends after the last page
+    reported by the API or after max_pages.
+    """
 
-    return False
+    def __init__(self, api_key: str, max_pages, depth=PREFETCH_DEPTH, workers=PREFETCH_WORKERS, fetch=None,
+                 filters=None, fields=None, batch_pages=BATCH_MAX_PAGES):
+        self.fetch = fetch or (lambda page: get_nations(api_key, page, filters, fields))
+        self.fetch_batch = lambda pages: get_nations_batch(api_key, pages, filters, fields)
+        self.sizer = BatchSizer(batch_pages) if batch_pages > 1 else None
+        self._slots = threading.Semaphore(depth)
+        self._cond = threading.Condition()
+        self._results = {}
+        self._batch_end = {}  # page -> last page of its batch, the slot is freed after that one
+        self._next_page = 1
+        self._last_page = max_pages
+        self._stopped = False
+        self._workers = [
+            threading.Thread(target=self._work, name=f"page-fetcher-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def _work(self):
+        while True:
+            self._slots.acquire()
+            with self._cond:
+                if self._stopped or self._next_page > self._last_page:
+                    self._slots.release()
+                    return
+                size = self.sizer.next_size() if self.sizer else 1
+                pages = list(range(self._next_page, min(self._next_page + size, self._last_page + 1)))
+                self._next_page = pages[-1] + 1
+
+            started = time.monotonic()
+            try:
+                if len(pages) == 1:
+                    results = {pages[0]: (self.fetch(pages[0]), None)}
+                else:
+                    batch = self.fetch_batch(pages)
+                    results = {page: (batch[page], None) for page in pages}
+                ok = True
+            except Exception as e:
+                results = {page: (None, e) for page in pages}
+                ok = False
+            if self.sizer:
+                self.sizer.record(len(pages), time.monotonic() - started, ok)
+
+            with self._cond:
+                for page, result in results.items():
+                    nations_data = result[0]
+                    if nations_data is not None and (
+                            not nations_data.get("data") or
+                            not nations_data.get("paginatorInfo", {}).get("hasMorePages")):
+                        # No need to fetch anything past the last page
+                        self._last_page = min(self._last_page, page)
+                    self._results[page] = result
+                    self._batch_end[page] = pages[-1]
+                self._cond.notify_all()
+
+    def __iter__(self):
+        page = 1
+        while True:
+            with self._cond:
+                while page not in self._results and page <= self._last_page and not self._stopped:
+                    self._cond.wait()
+                if page not in self._results:
+                    return
+                nations_data, error = self._results.pop(page)
+                batch_done = self._batch_end.pop(page) == page
+            if batch_done:
+                self._slots.release()
+            yield page, nations_data, error
+            page += 1
+
+    def close(self):
+        """Stop fetching further pages."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for _ in self._workers:
+            self._slots.release()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
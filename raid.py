@@ -1,12 +1,22 @@
-from pnw_api import get_my_nation, get_nations
-from filter import filter_targets
+from pnw_api import get_my_nation, stream_nations, invalidate_my_nation, expand_protected_alliances, PagePrefetcher, build_nations_query, BATCH_MAX_PAGES
+from filter import filter_targets, iter_targets, build_nation_filter, required_fields
+from columnar import filter_targets_columnar, to_columns
+from records import decode_nations
+from topk import TopK
+from snapshot import open_snapshot, snapshot_info, sync_snapshot, delta_sync, start_background_sync
 from tqdm import tqdm
 import traceback
 import argparse
+import copy
 import os
 import time
 from datetime import datetime
-from config import MIN_INFRA, MAX_INFRA, MIN_INACTIVE_DAYS, IGNORE_DNR, MAX_PAGES, MIN_SCORE_RATIO, MAX_SCORE_RATIO, MAX_SOLDIER_RATIO
+from watch import run_watch
+from colstore import open_store, export_snapshot
+from parallel import filter_many
+from batch import load_members, scan_members
+from metrics import metrics
+from config import MIN_INFRA, MAX_INFRA, MIN_INACTIVE_DAYS, IGNORE_DNR, MAX_PAGES, MIN_SCORE_RATIO, MAX_SCORE_RATIO, MAX_SOLDIER_RATIO, SNAPSHOT_PATH, SNAPSHOT_MAX_AGE, INFRA_PER_SCORE, WATCH_INTERVAL
 
 def get_last_updated():
     try:
@@ -33,6 +43,55 @@ def parse_args():
     parser.add_argument('--limit', type=int, default=10, help='Limit number of results (default: 10)')
     parser.add_argument('--max-pages', type=int, default=MAX_PAGES, 
                       help=f'Maximum number of pages to fetch (default: {MAX_PAGES}, use smaller number for testing)')
+    parser.add_argument('--no-server-filter', dest='server_filter', action='store_false',
+                      help='Fetch every nation page unfiltered and filter only locally')
+    parser.add_argument('--skip-war-check', dest='check_wars', action='store_false',
+                      help='Do not check war activity (also stops fetching war data)')
+    parser.add_argument('--all-fields', dest='project_fields', action='store_false',
+                      help='Request every nation field instead of only those the active filters need')
+    parser.add_argument('--show-query', action='store_true',
+                      help='Print the GraphQL query a scan would send for page 1 and exit')
+    parser.add_argument('--batch-pages', type=int, default=BATCH_MAX_PAGES,
+                      help=f'Fetch up to N pages per API request, tuned from response times (default: {BATCH_MAX_PAGES}, no batching)')
+    parser.add_argument('--engine', choices=sorted(FILTER_ENGINES), default=DEFAULT_ENGINE,
+                      help=f'Filter implementation: vectorized columnar or the original row-wise loop (default: {DEFAULT_ENGINE})')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Filter large datasets (--offline, batch scans) across N processes; small ones stay single-process (default: 1)')
+    parser.add_argument('--stream', action='store_true',
+                      help='Decode pages while they download and filter nation by nation, keeping memory flat (no prefetch or page cache)')
+    parser.add_argument('--stats', action='store_true',
+                      help='Print request counts, cache hit rates, bytes received and time per stage after the scan')
+    parser.add_argument('--best', action='store_true',
+                      help='Keep scanning until the top --limit targets by infra are found, instead of stopping at the first --limit matches')
+    parser.add_argument('--treaty-hops', type=int, default=1,
+                      help='With --ignore-dnr, also skip alliances up to N treaty links away (default: 1, direct treaty partners; 2 adds allies of allies)')
+    parser.add_argument('--refresh-me', action='store_true',
+                      help='Refetch your nation, alliance and treaties instead of using cached copies')
+    parser.add_argument('--watch', action='store_true',
+                      help='Keep running and print target additions/removals as NDJSON (uses the snapshot, ignores --limit)')
+    parser.add_argument('--watch-interval', type=int, default=WATCH_INTERVAL,
+                      help=f'With --watch, seconds between refreshes within a turn (default: {WATCH_INTERVAL})')
+    parser.add_argument('--webhook',
+                      help='With --watch, also POST each batch of events as JSON to this URL')
+    parser.add_argument('--profile', action='append', metavar='KEY=VALUE,...',
+                      help=f'Add a filter profile overriding any of {", ".join(PROFILE_FIELDS)} '
+                           '(e.g. "name=low,max_infra=1500,inactive_time=7"). Repeat to evaluate several profiles in one scan')
+    parser.add_argument('--member-keys',
+                      help='Batch scan: file with one member API key per line')
+    parser.add_argument('--member-ids',
+                      help='Batch scan: comma-separated member nation IDs')
+    parser.add_argument('--deconflict', action='store_true',
+                      help='Batch scan: never give two members the same target')
+    parser.add_argument('--sync', action='store_true',
+                      help='Refresh stale pages of the local nation snapshot and exit')
+    parser.add_argument('--delta', action='store_true',
+                      help='With --sync, fetch only nations changed since the last sync (falls back to a full sync when needed)')
+    parser.add_argument('--sync-interval', type=int, default=0,
+                      help='With --sync, keep refreshing every N seconds until interrupted (default: 0, sync once)')
+    parser.add_argument('--offline', action='store_true',
+                      help='Filter against the local nation snapshot instead of fetching pages')
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH,
+                      help=f'Path to the local nation snapshot (default: {SNAPSHOT_PATH})')
     return parser.parse_args()
 
 def format_param_info(name, value, description=None):
@@ -59,9 +118,7 @@ def format_loot(loot, loot_value=None):
         return f"Lost ${loot['money']:,.0f}"
     return "No losses"
 
-def get_raid_targets(api_key, args):
-    # Get my nation's info first
-    my_nation = get_my_nation(api_key)
+def print_parameters(my_nation, args):
     max_soldiers = int(float(my_nation["soldiers"]) * args.troop_ratio)
     
     # Display all parameters and their meanings
@@ -96,85 +153,472 @@ def get_raid_targets(api_key, args):
         ))
 
     print("")  # Add a blank line for readability
-    
-    page = 1
-    all_nations = []
-    filtered = []
+
+# Filter implementations selectable with --engine
+FILTER_ENGINES = {
+    "columnar": filter_targets_columnar,
+    "rowwise": filter_targets
+}
+DEFAULT_ENGINE = "columnar"
+
+def filter_engine(args):
+    """Filter function selected by the scan arguments."""
+    return FILTER_ENGINES[getattr(args, "engine", DEFAULT_ENGINE)]
+
+def filter_kwargs(args):
+    """Map scan arguments onto filter_targets keyword arguments."""
+    return {
+        "min_infra": args.min_infra,
+        "max_infra": args.max_infra,
+        "min_inactive_days": args.inactive_time,
+        "ignore_alliance": args.ignore_dnr,
+        "max_soldier_ratio": args.troop_ratio,
+        "check_wars": getattr(args, "check_wars", True)
+    }
+
+def scan_fields(args):
+    """Field selection for scan pages (None requests every field)."""
+    if not getattr(args, "project_fields", True):
+        return None
+    return required_fields(ignore_alliance=args.ignore_dnr, check_wars=getattr(args, "check_wars", True))
+
+def report(progress, event_type, **payload):
+    """Send a progress event to the optional progress callback."""
+    if progress is not None:
+        progress(event_type, **payload)
+
+def load_my_nation(api_key, args):
+    """Get my nation, dropping the cached copy first if args.refresh_me is set."""
+    if getattr(args, "refresh_me", False):
+        invalidate_my_nation(api_key)
+    return get_my_nation(api_key)
+
+def load_protected_alliances(api_key, my_nation, args):
+    """Alliance IDs protected by treaties, built once per scan."""
+    if not args.ignore_dnr:
+        # Only nations without an alliance can match
+        return set()
+    protected = expand_protected_alliances(api_key, my_nation.get("alliance"), hops=getattr(args, "treaty_hops", 1))
+    print(f"Skipping {len(protected)} alliance(s) protected by treaties")
+    return protected
+
+# Scan arguments a filter profile may override, with their types
+PROFILE_FIELDS = {
+    "name": str,
+    "min_infra": int,
+    "max_infra": int,
+    "inactive_time": float,
+    "troop_ratio": float,
+    "ignore_dnr": bool,
+    "check_wars": bool,
+    "limit": int
+}
+
+def parse_profile_value(key, value):
+    if key not in PROFILE_FIELDS:
+        raise ValueError(f"Unknown profile field '{key}' (expected one of {', '.join(PROFILE_FIELDS)})")
+    if PROFILE_FIELDS[key] is bool and isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return PROFILE_FIELDS[key](value)
+
+def parse_profile(text):
+    """Parse a --profile value like "name=low,min_infra=500,inactive_time=5"."""
+    profile = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid profile setting '{item}', expected key=value")
+        profile[key.strip()] = value.strip()
+    return profile
+
+def make_profiles(args, profiles=None):
+    """
+    Scan arguments for each filter profile.
+
+    Args:
+        args: Base scan arguments
+        profiles: List of dictionaries overriding PROFILE_FIELDS of args
+
+    Returns:
+        List of argument objects, one per profile, each with a name
+        (just [args] without profiles)
+
+    Raises:
+        ValueError: If a profile has unknown fields or invalid values
+    """
+    if not profiles:
+        return [args]
+
+    result = []
+    for i, overrides in enumerate(profiles, 1):
+        if not isinstance(overrides, dict):
+            raise ValueError(f"Profile {i} must be an object of settings")
+        profile = copy.copy(args)
+        profile.name = f"profile {i}"
+        for key, value in overrides.items():
+            setattr(profile, key, parse_profile_value(key, value))
+        result.append(profile)
+    return result
+
+def combined_profile(args, profiles):
+    """Arguments for fetching pages that satisfy every profile."""
+    combined = copy.copy(args)
+    combined.ignore_dnr = any(p.ignore_dnr for p in profiles)
+    combined.check_wars = any(getattr(p, "check_wars", True) for p in profiles)
+    return combined
+
+def filter_profiles(nations, my_nation, profiles, protected):
+    """
+    Filter one batch of nations for every profile.
+
+    The nations are decoded (and, for the columnar engine, put into columns)
+    once and shared by all profiles.
+
+    Args:
+        nations: NationRecords, or a columns dictionary from to_columns
+        my_nation: Your nation data
+        profiles: Scan arguments per profile
+        protected: Protected alliance IDs per profile
+
+    Returns:
+        List of target lists, one per profile
+    """
+    if len(profiles) > 1 and not isinstance(nations, dict):
+        nations = decode_nations(nations)
+        if filter_engine(profiles[0]) is filter_targets_columnar:
+            nations = to_columns(nations)
+
+    results = []
+    for profile, profile_protected in zip(profiles, protected):
+        engine = filter_engine(profile)
+        # Row-wise filtering needs the records behind shared columns
+        profile_nations = nations["rows"] if isinstance(nations, dict) and engine is not filter_targets_columnar else nations
+        results.append(engine(profile_nations, my_nation, protected_alliances=profile_protected, **filter_kwargs(profile)))
+    return results
+
+def print_profiles(my_nation, profiles):
+    for profile in profiles:
+        if len(profiles) > 1:
+            print(f"\nProfile: {profile.name}")
+        print_parameters(my_nation, profile)
+
+def report_target(progress, target, profile, profiles):
+    """Report a kept target, naming its profile when several are scanned."""
+    if len(profiles) > 1:
+        report(progress, "target", target=target, profile=profile.name)
+    else:
+        report(progress, "target", target=target)
+
+def report_my_nation(progress, my_nation):
+    report(progress, "my_nation",
+           score=float(my_nation["score"]),
+           soldiers=int(my_nation["soldiers"]),
+           spies=int(my_nation.get("spies") or 0),
+           alliance=(my_nation.get("alliance") or {}).get("name"))
+
+def get_offline_targets(api_key, args, progress=None, profiles=None):
+    """Filter the local nation snapshot instead of fetching nation pages."""
+    profiles = profiles or [args]
+    my_nation = load_my_nation(api_key, args)
+    report_my_nation(progress, my_nation)
+    print_profiles(my_nation, profiles)
+
+    conn = open_snapshot(args.snapshot)
+    try:
+        info = snapshot_info(conn)
+        if not info["nations"]:
+            raise ValueError(f"Snapshot {args.snapshot} is empty. Run with --sync first.")
+        age_minutes = (time.time() - info["oldest_sync"]) / 60
+        print(f"Using snapshot {args.snapshot}: {info['nations']:,} nations from {info['pages']} pages (oldest page {age_minutes:.0f} min old)")
+        if info["watermark"]:
+            print(f"  Changes merged up to {(time.time() - info['watermark']) / 60:.0f} min ago")
+
+    finally:
+        conn.close()
+
+    # Memory-mapped columns, rewritten from the snapshot only when it changed
+    store = open_store(args.snapshot, info)
+    try:
+        # Only nations inside war range can match, they are one slice of the score-sorted file
+        score = float(my_nation["score"])
+        columns = store.score_range(score * MIN_SCORE_RATIO, score * MAX_SCORE_RATIO)
+        protected = [load_protected_alliances(api_key, my_nation, profile) for profile in profiles]
+
+        if getattr(args, "workers", 1) > 1 and getattr(args, "engine", DEFAULT_ENGINE) == "columnar":
+            # One sharded pass answers every profile
+            queries = [(my_nation, dict(filter_kwargs(profile), protected_alliances=profile_protected))
+                       for profile, profile_protected in zip(profiles, protected)]
+            with metrics.timed("filter"):
+                results = filter_many(columns, queries, limit=max(p.limit for p in profiles), workers=args.workers)
+        else:
+            with metrics.timed("filter"):
+                results = filter_profiles(columns, my_nation, profiles, protected)
+        results = [targets[:profile.limit] for targets, profile in zip(results, profiles)]
+        nation_count = len(columns["rows"])
+        metrics.inc("nations_scanned", nation_count)
+        del columns
+    finally:
+        store.close()
+    report(progress, "page", page=1, max_pages=1, nations=nation_count, matches=sum(len(r) for r in results))
+    for profile, targets in zip(profiles, results):
+        for target in targets:
+            report_target(progress, target, profile, profiles)
+    return my_nation, results
+
+@metrics.timed("scan")
+def get_streaming_targets(api_key, args, progress=None):
+    """
+    Scan nation pages as a streaming pipeline with bounded memory.
+
+    Each page is decoded while it downloads and every nation goes straight
+    through the row-wise filter into the top-K heap, so only the current
+    nation, the kept targets and counters are held. Pages are fetched one
+    after another and bypass the shared nation cache.
+    """
+    my_nation = load_my_nation(api_key, args)
+    report_my_nation(progress, my_nation)
+    print_parameters(my_nation, args)
+
+    server_filter = getattr(args, "server_filter", True)
+    nation_filter = build_nation_filter(my_nation, ignore_alliance=args.ignore_dnr) if server_filter else None
+    protected = load_protected_alliances(api_key, my_nation, args)
+    best = getattr(args, "best", False)
+
+    top = TopK(args.limit)
+    nations_seen = 0
+    for page in range(1, args.max_pages + 1):
+        stream = stream_nations(api_key, page, nation_filter, scan_fields(args))
+        page_min_score = None
+        matches = 0
+
+        def scores(records):
+            # Track the lowest score on the page for the --best bound as nations pass
+            nonlocal page_min_score
+            for n in records:
+                page_min_score = n.score if page_min_score is None else min(page_min_score, n.score)
+                yield n
+
+        for target in iter_targets(scores(stream), my_nation, protected_alliances=protected, **filter_kwargs(args)):
+            matches += 1
+            if top.push(target):
+                report(progress, "target", target=target)
+        nations_seen += stream.count
+        metrics.inc("nations_scanned", stream.count)
+        report(progress, "page", page=page, max_pages=args.max_pages, nations=stream.count, matches=matches)
+
+        if not stream.count:
+            break
+        if top.full:
+            if not best:
+                print(f"\nFound {len(top)} targets, stopping search")
+                break
+            if server_filter and page_min_score is not None:
+                infra_bound = min(args.max_infra, INFRA_PER_SCORE * page_min_score)
+                if infra_bound <= top.threshold:
+                    print(f"\nNo later page can beat the current top {len(top)} (infra bound {infra_bound:,.0f}), stopping search")
+                    break
+        if not stream.has_more:
+            break
+
+    print(f"Streamed {nations_seen:,} nations")
+    return my_nation, top.results()
+
+def get_raid_targets(api_key, args, progress=None):
+    """
+    Scan nation pages for raid targets.
+
+    Args:
+        api_key: The Politics & War API key.
+        args: Scan arguments (see parse_args)
+        progress: Optional callable, called as progress(event_type, **payload)
+            with "my_nation", "page" and "target" events as the scan runs
+
+    Returns:
+        (my_nation, targets) with targets sorted by infrastructure
+    """
+    if getattr(args, "stream", False) and not getattr(args, "offline", False):
+        return get_streaming_targets(api_key, args, progress)
+    my_nation, results = get_profile_targets(api_key, args, progress=progress)
+    return my_nation, results[0]
+
+@metrics.timed("scan")
+def get_profile_targets(api_key, args, profiles=None, progress=None):
+    """
+    Scan once and evaluate several filter profiles against every page.
+
+    Pages are fetched and decoded once for all profiles and each keeps its
+    own top-K; the scan stops when no profile can improve any more.
+
+    Args:
+        api_key: The Politics & War API key.
+        args: Scan arguments (see parse_args)
+        profiles: Scan arguments per profile, see make_profiles (default: just args)
+        progress: Optional callable, called as progress(event_type, **payload).
+            With several profiles, "target" events carry the profile name
+
+    Returns:
+        (my_nation, [targets per profile]) with targets sorted by infrastructure
+    """
+    profiles = profiles or [args]
+    if getattr(args, "offline", False):
+        return get_offline_targets(api_key, args, progress, profiles)
+    if getattr(args, "stream", False) and len(profiles) > 1:
+        raise ValueError("--stream scans one profile at a time")
+
+    # Fetch what the most inclusive profile needs
+    fetch_args = combined_profile(args, profiles)
+    if getattr(args, "server_filter", True):
+        # The server-side score range comes from my nation, so it has to be
+        # known before the first page is requested
+        my_nation = load_my_nation(api_key, args)
+        nation_filter = build_nation_filter(my_nation, ignore_alliance=fetch_args.ignore_dnr,
+                                            shared_band=getattr(args, "shared_pages", False))
+        prefetcher = PagePrefetcher(api_key, args.max_pages, filters=nation_filter, fields=scan_fields(fetch_args),
+                                    batch_pages=getattr(args, "batch_pages", BATCH_MAX_PAGES)).start()
+    else:
+        # Start fetching nation pages right away so page 1 goes out together
+        # with the me query instead of after it
+        prefetcher = PagePrefetcher(api_key, args.max_pages, fields=scan_fields(fetch_args),
+                                    batch_pages=getattr(args, "batch_pages", BATCH_MAX_PAGES)).start()
+        try:
+            my_nation = load_my_nation(api_key, args)
+        except Exception:
+            prefetcher.close()
+            raise
+    report_my_nation(progress, my_nation)
+    print_profiles(my_nation, profiles)
+
+    # With score ordering, no nation on a later page can have more infra
+    # than INFRA_PER_SCORE times the lowest score seen so far
+    score_ordered = getattr(args, "server_filter", True)
+    best = getattr(args, "best", False)
+
+    nations_seen = 0
+    tops = [TopK(profile.limit) for profile in profiles]
     
     pbar = tqdm(desc="Fetching nations", unit="page")
     
-    while True:
-        try:
-            print(f"Fetching page {page}...")
-            nations_data = get_nations(api_key, page)
+    try:
+        protected = [load_protected_alliances(api_key, my_nation, profile) for profile in profiles]
+
+        # Pages keep downloading in the background while the current one is filtered
+        for page, nations_data, error in prefetcher:
+            if error is not None:
+                print(f"\n❌ Error fetching page {page}: {str(error)}")
+                traceback.print_exception(type(error), error, error.__traceback__)
+
+                # If we already have some nations, just use what we have
+                if nations_seen:
+                    print(f"\n✅ Using {nations_seen} nations already fetched before error")
+                    break
+
+                # No nations fetched yet, try one more time with a delay
+                try:
+                    print("Retrying with a 5-second delay...")
+                    time.sleep(5)
+                    nations_data = prefetcher.fetch(page)
+                except Exception as retry_e:
+                    print(f"\n❌ Retry also failed: {str(retry_e)}")
+                    # Terminate with an error if we can't fetch any data
+                    raise ValueError("Could not fetch any nation data from API after retries")
 
             if not nations_data["data"]:  # No more nations to fetch
                 break
                 
-            # Process just the current page of nations
-            current_page_nations = nations_data["data"]
-            all_nations.extend(current_page_nations)
+            # Process just the current page of nations, decoded once into compact records
+            with metrics.timed("records"):
+                current_page_nations = decode_nations(nations_data["data"])
+            nations_seen += len(current_page_nations)
+            metrics.inc("nations_scanned", len(current_page_nations))
             pbar.update(1)
             
-            # Filter just the current page nations (faster)
-            new_targets = filter_targets(
-                current_page_nations,
-                my_nation,
-                min_infra=args.min_infra,
-                max_infra=args.max_infra,
-                min_inactive_days=args.inactive_time,
-                ignore_alliance=args.ignore_dnr,
-                max_soldier_ratio=args.troop_ratio
-            )
+            # Filter just the current page nations (faster), for every profile
+            with metrics.timed("filter"):
+                page_results = filter_profiles(current_page_nations, my_nation, profiles, protected)
             
-            # Add new targets to our filtered list
-            filtered.extend(new_targets)
+            # Keep only the best targets so far (highest infrastructure)
+            report(progress, "page", page=page, max_pages=args.max_pages,
+                   nations=len(current_page_nations), matches=sum(len(r) for r in page_results))
+            for profile, top, new_targets in zip(profiles, tops, page_results):
+                for target in new_targets:
+                    if top.push(target):
+                        report_target(progress, target, profile, profiles)
             
-            # Sort by infrastructure (highest first)
-            filtered = sorted(filtered, key=lambda x: x["infra"], reverse=True)
-            
-            # Limit to the requested number of targets
-            if len(filtered) >= args.limit:
-                filtered = filtered[:args.limit]
-                print(f"\nFound {len(filtered)} targets, stopping search")
-                break
+            if all(top.full for top in tops):
+                if not best:
+                    # Default mode: stop at the first page that fills the limit
+                    print(f"\nFound {sum(len(top) for top in tops)} targets, stopping search")
+                    break
+                if score_ordered and current_page_nations:
+                    page_bound = INFRA_PER_SCORE * min(n.score for n in current_page_nations)
+                    if all(min(profile.max_infra, page_bound) <= top.threshold for profile, top in zip(profiles, tops)):
+                        print(f"\nNo later page can beat the current top targets (infra bound {page_bound:,.0f}), stopping search")
+                        break
             
             # Check if we should continue to next page
             paginator = nations_data.get("paginatorInfo", {})
             if not paginator.get("hasMorePages") or page >= args.max_pages:  # Stop at max pages
                 print(f"\nReached page limit ({page}/{args.max_pages})")
                 break
-                
-            page += 1
-        except Exception as e:
-            print(f"\n❌ Error fetching page {page}: {str(e)}")
-            traceback.print_exc()
-            
-            # If we already have some nations, just use what we have
-            if all_nations:
-                print(f"\n✅ Using {len(all_nations)} nations already fetched before error")
-                break
-            else:
-                # No nations fetched yet, try one more time with a delay
-                try:
-                    print("Retrying with a 5-second delay...")
-                    time.sleep(5)
-                    nations_data = get_nations(api_key, page)
-                    all_nations.extend(nations_data["data"])
-                    pbar.update(1)
-                    page += 1
-                except Exception as retry_e:
-                    print(f"\n❌ Retry also failed: {str(retry_e)}")
-                    # Terminate with an error if we can't fetch any data
-                    if not all_nations:
-                        raise ValueError("Could not fetch any nation data from API after retries")
-                    break
-
-    pbar.close()
+    finally:
+        prefetcher.close()
+        pbar.close()
     
-    return my_nation, filtered
+    return my_nation, [top.results() for top in tops]
+
+def print_profile_results(args, profiles, results):
+    """Print (or dump as JSON) the targets of a multi-profile scan."""
+    if args.json:
+        import json
+        print(json.dumps([{"name": p.name, "targets": targets} for p, targets in zip(profiles, results)], indent=2))
+        return
+
+    for profile, targets in zip(profiles, results):
+        print(f"\n🎯 {profile.name}: {len(targets)} target(s) "
+              f"(infra {profile.min_infra:,}-{profile.max_infra:,}, {profile.inactive_time:.1f}d inactive, "
+              f"troops {profile.troop_ratio:.0%})")
+        for i, t in enumerate(targets, 1):
+            print(f"  {i}. {t['name']} (ID: {t['id']}) | Score: {t['score']:,.2f} | Infra: {t['infra']:,.2f} | "
+                  f"Inactive: {t['inactive_days']}d")
+            print(f"     Attack: https://politicsandwar.com/nation/war/declare/id={t['id']}")
+
+def read_member_keys(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def scan_alliance(api_key, args):
+    """Batch scan for several members and print each member's targets."""
+    member_keys = read_member_keys(args.member_keys) if args.member_keys else []
+    member_ids = [i for i in (args.member_ids or "").split(",") if i.strip()]
+    members = load_members(api_key, member_keys, member_ids)
+
+    results = scan_members(api_key, members, args,
+                           lambda nations, my_nation, protected: filter_engine(args)(
+                               nations, my_nation, protected_alliances=protected, **filter_kwargs(args)),
+                           load_protected_alliances, fields=scan_fields(args), criteria=filter_kwargs(args))
+
+    if args.json:
+        import json
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\n📊 Targets for {len(results)} member(s){' (deconflicted)' if args.deconflict else ''}:")
+    for label, targets in results.items():
+        print(f"\n🎯 {label}: {len(targets)} target(s)")
+        for i, t in enumerate(targets, 1):
+            print(f"  {i}. {t['name']} (ID: {t['id']}) | Score: {t['score']:,.2f} | Infra: {t['infra']:,.2f} | "
+                  f"Inactive: {t['inactive_days']}d")
+            print(f"     Attack: https://politicsandwar.com/nation/war/declare/id={t['id']}")
+
+def print_stats():
+    print("\n📈 Scan statistics:")
+    for line in metrics.summary():
+        print(line)
 
 def main():
+    args = None
     try:
         args = parse_args()
         print("[⚔️] Samurai Raid Scanner - Finding optimal targets...\n")
@@ -185,6 +629,47 @@ def main():
         if not api_key:
              raise ValueError("PNW_API_KEY environment variable is not set for CLI usage.")
 
+        if args.sync:
+            if args.sync_interval > 0:
+                print(f"Syncing snapshot {args.snapshot} every {args.sync_interval}s (Ctrl+C to stop)...")
+                thread, stop_event = start_background_sync(api_key, args.snapshot, args.max_pages, args.sync_interval,
+                                                           delta=args.delta)
+                try:
+                    while thread.is_alive():
+                        thread.join(1)
+                except KeyboardInterrupt:
+                    stop_event.set()
+            else:
+                if args.delta:
+                    delta_sync(api_key, args.snapshot, full_max_pages=args.max_pages)
+                else:
+                    sync_snapshot(api_key, args.snapshot, max_pages=args.max_pages, max_age=SNAPSHOT_MAX_AGE)
+                # Ready the columnar file so the next --offline scan starts instantly
+                export_snapshot(args.snapshot)
+            return
+
+        if args.watch:
+            run_watch(api_key, args, load_my_nation, load_protected_alliances,
+                      lambda nations, my_nation, protected: filter_engine(args)(
+                          nations, my_nation, protected_alliances=protected, **filter_kwargs(args)))
+            return
+
+        if args.member_keys or args.member_ids:
+            scan_alliance(api_key, args)
+            return
+
+        if args.profile:
+            profiles = make_profiles(args, [parse_profile(text) for text in args.profile])
+            my_nation, results = get_profile_targets(api_key, args, profiles)
+            print_profile_results(args, profiles, results)
+            return
+
+        if args.show_query:
+            my_nation = load_my_nation(api_key, args)
+            nation_filter = build_nation_filter(my_nation, ignore_alliance=args.ignore_dnr) if args.server_filter else None
+            print(build_nations_query(1, nation_filter, scan_fields(args)))
+            return
+
         my_nation, filtered = get_raid_targets(api_key, args)
 
         if args.json:
@@ -221,6 +706,10 @@ def main():
         print("  --ignore-dnr         Show nations in alliances (respects treaties) (current: {})".format(args.ignore_dnr))
         print("  --json               Output results in JSON format")
         print("  --limit N            Limit number of results (current: {})".format(args.limit))
+        print("  --best               Find the top --limit targets instead of the first ones (current: {})".format(args.best))
+        print("  --sync               Refresh the local nation snapshot")
+        print("  --watch              Keep running and report new and lost targets")
+        print("  --offline            Filter against the local nation snapshot (current: {})".format(args.offline))
 
         # Print footer
         print("\n" + "=" * 80)
@@ -231,6 +720,9 @@ def main():
     except Exception as e:
         print(f"\n❌ Fatal error: {str(e)}")
         traceback.print_exc()
+    finally:
+        if args is not None and args.stats:
+            print_stats()
 
 if __name__ == "__main__":
     main()
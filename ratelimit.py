@@ -0,0 +1,123 @@
+import random
+import threading
+import time
+
+# Rates are in requests per second
+INITIAL_RATE = 1.0  # Same pace as the old fixed 1 second delay
+MIN_RATE = 0.1  # Never slow down below one request every 10 seconds
+MAX_RATE = 5.0  # Never speed up beyond this, even if the API reports budget
+RATE_INCREASE = 0.1  # Additive increase after each successful request
+RATE_DECREASE = 0.5  # Multiplicative decrease after a 429
+BURST = 3  # Requests that may go out back to back after an idle period
+BACKOFF_BASE = 2.0  # Seconds for the first 429 retry, doubled on each further retry
+BACKOFF_MAX = 60.0  # Upper bound for a single backoff wait
+
+def _header_float(headers, name):
+    value = headers.get(name) if headers else None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class RateController:
+    """
+    Token bucket shared by every request to the API, with AIMD rate adjustment.
+
+    Tokens refill at `rate` per second up to `burst`, so idle callers do not
+    wait at all. Each successful response nudges the rate up (additive
+    increase); a 429 halves it (multiplicative decrease). When the API reports
+    its remaining budget in the X-RateLimit-* headers, the rate is capped so
+    the remaining requests are spread over the time left in the window.
+    """
+
+    def __init__(self, rate=INITIAL_RATE, burst=BURST, min_rate=MIN_RATE, max_rate=MAX_RATE):
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._burst = burst
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._budget_rate = None  # Cap derived from the rate-limit headers
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self):
+        """Current allowed request rate in requests per second."""
+        with self._lock:
+            return self._effective_rate()
+
+    def _effective_rate(self):
+        if self._budget_rate is not None:
+            return max(self._min_rate, min(self._rate, self._budget_rate))
+        return self._rate
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._tokens = min(self._burst, self._tokens + elapsed * self._effective_rate())
+        self._updated = now
+
+    def acquire(self):
+        """Block until a request may be sent, then spend one token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._effective_rate()
+            time.sleep(wait)
+
+    def on_success(self, headers=None):
+        """Record a successful response and adjust the rate."""
+        with self._lock:
+            self._rate = min(self._max_rate, self._rate + RATE_INCREASE)
+            self._update_budget(headers)
+
+    def on_rate_limited(self, attempt, headers=None):
+        """
+        Record a 429 response.
+
+        Args:
+            attempt: Zero-based retry attempt number
+            headers: Response headers
+
+        Returns:
+            Seconds to wait before retrying
+        """
+        with self._lock:
+            self._rate = max(self._min_rate, self._rate * RATE_DECREASE)
+            self._update_budget(headers)
+            # Drop any saved-up burst so other callers slow down too
+            self._tokens = min(self._tokens, 0.0)
+
+        retry_after = _header_float(headers, "Retry-After")
+        if retry_after is not None:
+            return min(BACKOFF_MAX, retry_after) + random.uniform(0, 1)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+    def _update_budget(self, headers):
+        remaining = _header_float(headers, "X-RateLimit-Remaining")
+        if remaining is None:
+            self._budget_rate = None
+            return
+
+        reset_after = _header_float(headers, "X-RateLimit-Reset-After")
+        if reset_after is None:
+            reset_at = _header_float(headers, "X-RateLimit-Reset")
+            if reset_at is not None:
+                reset_after = reset_at - time.time()
+        if reset_after is None or reset_after <= 0:
+            self._budget_rate = None
+            return
+
+        self._budget_rate = remaining / reset_after
+
+rate_controller = RateController()
+
+def get_rate():
+    """Current request rate allowed by the shared controller."""
+    return rate_controller.rate
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+def parse_timestamp(value):
+    """Convert an API timestamp ("2024-01-01T00:00:00+00:00") to epoch seconds."""
+    return datetime.fromisoformat(value).timestamp()
+
+class NationRecord:
+    """
+    Compact, typed view of one nation, decoded once when a page is ingested.
+
+    Numeric strings are converted, timestamps are epoch seconds, total infra
+    and active defensive wars are precomputed, and the raw city and war lists
+    are dropped.
+    """
+
+    __slots__ = (
+        "id", "name", "score", "last_active", "alliance_id", "alliance_name",
+        "soldiers", "spies", "vmode_turns", "color", "total_infra", "city_count",
+        "last_war", "def_wars"
+    )
+
+    def __init__(self, id, name, score, last_active, alliance_id=0, alliance_name=None,
+                 soldiers=0, spies=0, vmode_turns=0, color="", total_infra=0.0, city_count=0,
+                 last_war=None, def_wars=0):
+        self.id = id
+        self.name = name
+        self.score = score
+        self.last_active = last_active  # Epoch seconds
+        self.alliance_id = alliance_id  # 0 when the nation has no alliance
+        self.alliance_name = alliance_name
+        self.soldiers = soldiers
+        self.spies = spies
+        self.vmode_turns = vmode_turns
+        self.color = color
+        self.total_infra = total_infra
+        self.city_count = city_count
+        self.last_war = last_war  # Epoch seconds of the most recent war, None without wars
+        self.def_wars = def_wars  # Active defensive wars (only counted when the nation has wars)
+
+    @classmethod
+    def from_api(cls, n):
+        """
+        Decode a nation dict as returned by get_nations.
+
+        Raises:
+            KeyError, TypeError, ValueError: If required fields are missing or malformed
+        """
+        cities = n["cities"]
+        wars = n.get("wars")
+        last_war, def_wars = None, 0
+        if wars:
+            # First war is the most recent
+            last_war = parse_timestamp(wars[0]["date"])
+            def_wars = sum(1 for war in n.get("defensive_wars") or [] if int(war.get("turnsleft", 0)) > 0)
+
+        alliance = n.get("alliance") or {}
+        return cls(
+            id=int(n["id"]),
+            name=n.get("nation_name", "Unknown"),
+            score=float(n["score"]),
+            last_active=parse_timestamp(n["last_active"]),
+            alliance_id=int(n.get("alliance_id") or 0),
+            alliance_name=alliance.get("name"),
+            soldiers=int(n.get("soldiers", 0)),
+            spies=int(n.get("spies", 0)),
+            vmode_turns=int(n.get("vacation_mode_turns", 0)),
+            color=(n.get("color") or "").lower(),
+            total_infra=sum(float(city["infrastructure"]) for city in cities),
+            city_count=len(cities),
+            last_war=last_war,
+            def_wars=def_wars
+        )
+
+    def __repr__(self):
+        return f"NationRecord(id={self.id}, name={self.name!r}, score={self.score})"
+
+def decode_nations(nations):
+    """
+    Decode nation dicts into NationRecords, skipping rows that cannot be decoded.
+
+    Records that are already decoded are passed through unchanged.
+    """
+    records = []
+    for n in nations:
+        if isinstance(n, NationRecord):
+            records.append(n)
+            continue
+        try:
+            records.append(NationRecord.from_api(n))
+        except (KeyError, TypeError, ValueError):
+            continue
+    return records
@@ -0,0 +1,366 @@
+import json
+import sqlite3
+import threading
+import time
+from pnw_api import get_nations, get_recent_wars
+from records import parse_timestamp
+from config import SNAPSHOT_PATH, SNAPSHOT_MAX_AGE, MAX_PAGES, DELTA_MAX_PAGES, DELTA_OVERLAP
+
+# Nation rows are kept as the raw API dicts so filter_targets can run against
+# them unchanged. Score and last_active are duplicated into columns for queries.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nations (
+    id INTEGER PRIMARY KEY,
+    page INTEGER NOT NULL,
+    score REAL NOT NULL,
+    last_active TEXT,
+    data TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_nations_score ON nations (score);
+CREATE INDEX IF NOT EXISTS idx_nations_page ON nations (page);
+CREATE TABLE IF NOT EXISTS pages (
+    page INTEGER PRIMARY KEY,
+    nation_count INTEGER NOT NULL,
+    has_more INTEGER NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def open_snapshot(path=SNAPSHOT_PATH):
+    """
+    Open (and create if needed) the local nation snapshot store.
+
+    Args:
+        path: Path to the SQLite database file
+
+    Returns:
+        sqlite3 connection with the schema in place
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def save_page(conn, page, nations_data):
+    """
+    Store one page of nations as returned by get_nations.
+
+    Nations previously stored on this page but missing from the new data are
+    removed; if they only moved to another page they come back when that page
+    is synced.
+
+    Args:
+        conn: Snapshot connection
+        page: Page number the data was fetched from
+        nations_data: Dictionary with "data" and "paginatorInfo" from get_nations
+    """
+    now = time.time()
+    nations = nations_data.get("data", [])
+    has_more = bool(nations_data.get("paginatorInfo", {}).get("hasMorePages"))
+
+    with conn:
+        ids = [int(n["id"]) for n in nations]
+        placeholders = ",".join("?" * len(ids))
+        if ids:
+            conn.execute(f"DELETE FROM nations WHERE page = ? AND id NOT IN ({placeholders})", [page, *ids])
+        else:
+            conn.execute("DELETE FROM nations WHERE page = ?", (page,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO nations (id, page, score, last_active, data, synced_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(int(n["id"]), page, float(n["score"]), n.get("last_active"), json.dumps(n), now) for n in nations]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO pages (page, nation_count, has_more, synced_at) VALUES (?, ?, ?, ?)",
+            (page, len(nations), int(has_more), now)
+        )
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def set_meta(conn, key, value):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+def upsert_nations(conn, nations):
+    """
+    Merge changed nations into the snapshot.
+
+    Nations already stored keep their page, new ones get page 0 until the
+    next full sync places them.
+
+    Args:
+        conn: Snapshot connection
+        nations: List of nation dictionaries from the API
+    """
+    now = time.time()
+    with conn:
+        conn.executemany(
+            """INSERT INTO nations (id, page, score, last_active, data, synced_at) VALUES (?, 0, ?, ?, ?, ?)
+               ON CONFLICT (id) DO UPDATE SET score = excluded.score, last_active = excluded.last_active,
+                                              data = excluded.data, synced_at = excluded.synced_at""",
+            [(int(n["id"]), float(n["score"]), n.get("last_active"), json.dumps(n), now) for n in nations]
+        )
+
+def load_nations(conn, min_score=None, max_score=None):
+    """
+    Load stored nations, optionally restricted to a score range.
+
+    Args:
+        conn: Snapshot connection
+        min_score: Lower score bound (inclusive)
+        max_score: Upper score bound (inclusive)
+
+    Returns:
+        List of nation dictionaries in the same shape as get_nations data
+    """
+    query = "SELECT data FROM nations"
+    clauses, params = [], []
+    if min_score is not None:
+        clauses.append("score >= ?")
+        params.append(min_score)
+    if max_score is not None:
+        clauses.append("score <= ?")
+        params.append(max_score)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return [json.loads(row[0]) for row in conn.execute(query, params)]
+
+def snapshot_info(conn):
+    """
+    Summarize the snapshot contents.
+
+    Returns:
+        Dictionary with nation count, page count, oldest/newest page sync time
+        and the delta sync watermark (None before the first delta sync)
+    """
+    nation_count = conn.execute("SELECT COUNT(*) FROM nations").fetchone()[0]
+    page_count, oldest, newest = conn.execute(
+        "SELECT COUNT(*), MIN(synced_at), MAX(synced_at) FROM pages"
+    ).fetchone()
+    return {
+        "nations": nation_count,
+        "pages": page_count,
+        "oldest_sync": oldest,
+        "newest_sync": newest,
+        "watermark": float(get_meta(conn, "delta_watermark")) if get_meta(conn, "delta_watermark") else None
+    }
+
+def sync_snapshot(api_key: str, path=SNAPSHOT_PATH, max_pages=MAX_PAGES, max_age=SNAPSHOT_MAX_AGE, force=False):
+    """
+    Refresh the snapshot page by page, skipping pages synced within max_age.
+
+    Args:
+        api_key: The Politics & War API key.
+        path: Path to the SQLite database file
+        max_pages: Maximum number of pages to keep in the snapshot
+        max_age: Seconds after which a stored page is considered stale
+        force: Refetch every page regardless of age
+
+    Returns:
+        Number of pages fetched from the API
+    """
+    conn = open_snapshot(path)
+    fetched = 0
+    try:
+        stored = {row[0]: (row[1], row[2]) for row in conn.execute("SELECT page, has_more, synced_at FROM pages")}
+        now = time.time()
+        for page in range(1, max_pages + 1):
+            if not force and page in stored and now - stored[page][1] < max_age:
+                # Page is fresh, only use it to decide whether to continue
+                if not stored[page][0]:
+                    break
+                continue
+
+            nations_data = get_nations(api_key, page, use_cache=False)
+            save_page(conn, page, nations_data)
+            fetched += 1
+
+            if not nations_data.get("paginatorInfo", {}).get("hasMorePages"):
+                break
+
+        # Drop pages beyond the last one the API reported
+        last_page = conn.execute("SELECT MIN(page) FROM pages WHERE has_more = 0").fetchone()[0]
+        if last_page is not None:
+            with conn:
+                conn.execute("DELETE FROM nations WHERE page > ?", (last_page,))
+                conn.execute("DELETE FROM pages WHERE page > ?", (last_page,))
+    finally:
+        conn.close()
+
+    print(f"Snapshot sync fetched {fetched} page(s) into {path}")
+    return fetched
+
+def fetch_changes(api_key, watermark, max_pages=DELTA_MAX_PAGES):
+    """
+    Nations changed since the watermark.
+
+    Reads nations by last_active and wars by ID, newest first, until rows
+    older than the watermark appear. Nations that were only attacked are
+    refetched by ID.
+
+    Returns:
+        (nations, pages_read), or (None, pages_read) if max_pages was not enough
+    """
+    changed = {}
+    pages_read = 0
+
+    page = 1
+    while True:
+        nations_data = get_nations(api_key, page, filters={"order_by": ("LAST_ACTIVE", "DESC")}, use_cache=False)
+        pages_read += 1
+        nations = nations_data.get("data", [])
+        page_changed = 0
+        for n in nations:
+            if n.get("last_active") and parse_timestamp(n["last_active"]) >= watermark:
+                changed[int(n["id"])] = n
+                page_changed += 1
+        # Pages are newest first, so a page with older rows is the last one with changes
+        if (page_changed < len(nations) or not nations
+                or not nations_data.get("paginatorInfo", {}).get("hasMorePages")):
+            break
+        if page >= max_pages:
+            return None, pages_read
+        page += 1
+
+    war_nation_ids = set()
+    page = 1
+    while True:
+        wars_data = get_recent_wars(api_key, page)
+        pages_read += 1
+        wars = wars_data.get("data", [])
+        recent = [war for war in wars if parse_timestamp(war["date"]) >= watermark]
+        for war in recent:
+            war_nation_ids.update((int(war["att_id"]), int(war["def_id"])))
+        if len(recent) < len(wars) or not wars or not wars_data.get("paginatorInfo", {}).get("hasMorePages"):
+            break
+        if page >= max_pages:
+            return None, pages_read
+        page += 1
+
+    # Nations in a new war whose last_active did not move still need their war data refreshed
+    war_nation_ids = sorted(war_nation_ids - changed.keys())
+    for start in range(0, len(war_nation_ids), 500):
+        chunk = war_nation_ids[start:start + 500]
+        nations_data = get_nations(api_key, 1, filters={"id": chunk}, use_cache=False)
+        pages_read += 1
+        for n in nations_data.get("data", []):
+            changed[int(n["id"])] = n
+
+    return list(changed.values()), pages_read
+
+def merge_changes(api_key: str, conn, max_pages=DELTA_MAX_PAGES):
+    """
+    Fetch nations changed since the snapshot's watermark and merge them in.
+
+    Args:
+        api_key: The Politics & War API key.
+        conn: Snapshot connection
+        max_pages: Most change pages to read
+
+    Returns:
+        (changed nations, requests made). Changed nations is None when the
+        snapshot has no watermark yet or more than max_pages changed, in
+        which case nothing was merged and a full sync is needed.
+    """
+    started = time.time()
+    watermark = get_meta(conn, "delta_watermark")
+    if watermark is None:
+        print("No sync watermark in the snapshot yet, running a full sync")
+        return None, 0
+
+    changed, requests_made = fetch_changes(api_key, float(watermark) - DELTA_OVERLAP, max_pages)
+    if changed is None:
+        print(f"More than {max_pages} pages changed since the last sync, running a full sync")
+        return None, requests_made
+
+    upsert_nations(conn, changed)
+    set_meta(conn, "delta_watermark", started)
+    return changed, requests_made
+
+def delta_sync(api_key: str, path=SNAPSHOT_PATH, max_pages=DELTA_MAX_PAGES, full_max_pages=MAX_PAGES):
+    """
+    Bring the snapshot up to date by fetching only what changed since the last sync.
+
+    The snapshot keeps a watermark (the start time of the last successful
+    sync). Without one, or when more than max_pages of changes piled up,
+    a full sync is run instead.
+
+    Args:
+        api_key: The Politics & War API key.
+        path: Path to the SQLite database file
+        max_pages: Most change pages to read before falling back to a full sync
+        full_max_pages: max_pages for the fallback full sync
+
+    Returns:
+        Number of API requests made
+    """
+    started = time.time()
+    conn = open_snapshot(path)
+    try:
+        changed, requests_made = merge_changes(api_key, conn, max_pages)
+        if changed is not None:
+            print(f"Delta sync merged {len(changed)} changed nation(s) into {path} ({requests_made} request(s))")
+            return requests_made
+    finally:
+        conn.close()
+
+    return full_sync(api_key, path, full_max_pages, started)
+
+def full_sync(api_key: str, path=SNAPSHOT_PATH, max_pages=MAX_PAGES, started=None):
+    """
+    Refetch every snapshot page and start a new delta watermark.
+
+    Args:
+        api_key: The Politics & War API key.
+        path: Path to the SQLite database file
+        max_pages: Maximum number of pages to fetch
+        started: Watermark to record (default: now, before fetching)
+
+    Returns:
+        Number of API requests made
+    """
+    started = time.time() if started is None else started
+    requests_made = sync_snapshot(api_key, path, max_pages=max_pages, force=True)
+    conn = open_snapshot(path)
+    try:
+        set_meta(conn, "delta_watermark", started)
+    finally:
+        conn.close()
+    return requests_made
+
+def start_background_sync(api_key: str, path=SNAPSHOT_PATH, max_pages=MAX_PAGES, interval=SNAPSHOT_MAX_AGE, delta=False):
+    """
+    Keep the snapshot fresh from a daemon thread.
+
+    Args:
+        api_key: The Politics & War API key.
+        path: Path to the SQLite database file
+        max_pages: Maximum number of pages to keep in the snapshot
+        interval: Seconds between sync passes (also used as the page max age)
+        delta: Use delta_sync instead of refreshing stale pages
+
+    Returns:
+        (thread, stop_event) - set stop_event to end the loop
+    """
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.is_set():
+            try:
+                if delta:
+                    delta_sync(api_key, path, full_max_pages=max_pages)
+                else:
+                    sync_snapshot(api_key, path, max_pages=max_pages, max_age=interval)
+            except Exception as e:
+                print(f"❌ Background snapshot sync failed: {str(e)}")
+            stop_event.wait(interval)
+
+    thread = threading.Thread(target=run, name="snapshot-sync", daemon=True)
+    thread.start()
+    return thread, stop_event
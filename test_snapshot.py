@@ -0,0 +1,35 @@
+import os
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault("PNW_API_KEY", "test")  # config.py refuses to load without one
+
+import snapshot
+
+def timestamp(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(seconds))
+
+class FetchChangesTest(unittest.TestCase):
+    def setUp(self):
+        self.watermark = time.time() - 3600
+        # 600 nations active since the watermark, then older ones, newest first
+        self.nations = [{"id": str(i), "last_active": timestamp(self.watermark + 3000 - i)} for i in range(600)]
+        self.nations += [{"id": str(i), "last_active": timestamp(self.watermark - 100 - i)} for i in range(600, 1500)]
+
+    def get_nations(self, api_key, page, filters=None, use_cache=True):
+        rows = self.nations[(page - 1) * 500:page * 500]
+        return {"data": rows, "paginatorInfo": {"hasMorePages": page * 500 < len(self.nations)}}
+
+    def test_changes_spanning_several_pages(self):
+        wars = {"data": [], "paginatorInfo": {"hasMorePages": False}}
+        with mock.patch.object(snapshot, "get_nations", side_effect=self.get_nations) as get_nations, \
+                mock.patch.object(snapshot, "get_recent_wars", return_value=wars):
+            changed, pages_read = snapshot.fetch_changes("key", self.watermark, max_pages=20)
+
+        self.assertEqual(len(changed), 600)
+        self.assertEqual(get_nations.call_count, 2)  # Stops at the first page with older nations
+        self.assertEqual(pages_read, 3)
+
+if __name__ == "__main__":
+    unittest.main()
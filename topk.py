@@ -0,0 +1,52 @@
+import heapq
+import itertools
+
+class TopK:
+    """
+    Keep the k best targets seen so far, ranked by infrastructure.
+
+    Backed by a min-heap of size k, so adding n targets costs O(n log k) and
+    the weakest kept target is always available as the threshold a new
+    target has to beat.
+    """
+
+    def __init__(self, k, key=lambda target: target["infra"]):
+        self.k = max(0, k)
+        self.key = key
+        self._heap = []
+        self._counter = itertools.count()  # Tie-breaker, keeps earlier targets on equal keys
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self):
+        return len(self._heap) >= self.k
+
+    @property
+    def threshold(self):
+        """Key of the weakest kept target once k targets are kept, otherwise None."""
+        if not self.full or not self._heap:
+            return None
+        return self._heap[0][0]
+
+    def push(self, item):
+        """Offer a target. Returns True if it is kept."""
+        if self.k == 0:
+            return False
+        entry = (self.key(item), -next(self._counter), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def extend(self, items):
+        """Offer several targets. Returns how many were kept."""
+        return sum(1 for item in items if self.push(item))
+
+    def results(self):
+        """Kept targets, best first."""
+        return [entry[2] for entry in sorted(self._heap, reverse=True)]
@@ -0,0 +1,183 @@
+import contextlib
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pnw_api import get_session
+from records import decode_nations
+from nation_index import NationIndex
+from snapshot import open_snapshot, load_nations, merge_changes, delta_sync, full_sync
+from config import TURN_SECONDS, WATCH_TURN_DELAY, WATCH_INTERVAL
+
+def next_refresh(now, interval=WATCH_INTERVAL, turn_delay=WATCH_TURN_DELAY):
+    """
+    Epoch time of the next refresh.
+
+    Refreshes happen every `interval` seconds, and always `turn_delay`
+    seconds after each turn change, when most nations change at once.
+    """
+    turn_refresh = (now - turn_delay) // TURN_SECONDS * TURN_SECONDS + TURN_SECONDS + turn_delay
+    return min(now + interval, turn_refresh)
+
+def current_turn(now):
+    return int(now // TURN_SECONDS)
+
+class TargetWatcher:
+    """
+    Keep the current raid target set up to date and report what changes.
+
+    Nations live in memory (and in the snapshot). Each refresh only fetches
+    nations changed since the last one and only those are re-filtered. Once
+    per turn, and whenever your own nation changes, every nation is
+    re-filtered locally to catch time-based changes such as a nation passing
+    the inactivity threshold.
+
+    Parameters:
+    - api_key: The Politics & War API key
+    - args: Scan arguments (see raid.parse_args)
+    - load_my_nation: Callable(api_key, args) returning your nation
+    - load_protected: Callable(api_key, my_nation, args) returning protected alliance IDs
+    - filter_nations: Callable(nations, my_nation, protected_alliances) returning targets
+    - emit: Callable receiving each event dictionary
+    """
+
+    def __init__(self, api_key, args, load_my_nation, load_protected, filter_nations, emit):
+        self.api_key = api_key
+        self.args = args
+        self.load_my_nation = load_my_nation
+        self.load_protected = load_protected
+        self.filter_nations = filter_nations
+        self.emit = emit
+        self.nations = {}  # id -> NationRecord
+        self.targets = {}  # id -> target dictionary
+        self.my_nation = None
+        self.protected = set()
+        self.turn = None
+
+    def load(self, full=False):
+        """
+        Bring the snapshot up to date and load every nation into memory.
+
+        With full=True the delta is skipped (it is known not to fit) and
+        every page is refetched.
+        """
+        if full:
+            full_sync(self.api_key, self.args.snapshot, self.args.max_pages)
+        else:
+            delta_sync(self.api_key, self.args.snapshot, full_max_pages=self.args.max_pages)
+        conn = open_snapshot(self.args.snapshot)
+        try:
+            self.nations = {n.id: n for n in decode_nations(load_nations(conn))}
+        finally:
+            conn.close()
+
+    def refresh(self, now=None):
+        """
+        Fetch changes and emit add/remove events.
+
+        Returns:
+            List of events emitted
+        """
+        now = time.time() if now is None else now
+        my_nation = self.load_my_nation(self.api_key, self.args)
+        my_nation_changed = self.my_nation is None or any(
+            str(my_nation.get(k)) != str(self.my_nation.get(k)) for k in ("score", "soldiers", "spies", "alliance_id"))
+        self.my_nation = my_nation
+        self.protected = self.load_protected(self.api_key, my_nation, self.args)
+
+        if not self.nations:
+            self.load()
+            changed_ids = None
+        else:
+            conn = open_snapshot(self.args.snapshot)
+            try:
+                changed, _ = merge_changes(self.api_key, conn)
+            finally:
+                conn.close()
+            if changed is None:
+                # Too much changed (or no watermark): start over from a full sync
+                self.load(full=True)
+                changed_ids = None
+            else:
+                records = decode_nations(changed)
+                self.nations.update((n.id, n) for n in records)
+                changed_ids = {n.id for n in records}
+
+        # Time-based criteria move every turn even for nations that did not change
+        if my_nation_changed or current_turn(now) != self.turn:
+            changed_ids = None
+        self.turn = current_turn(now)
+
+        return self.evaluate(changed_ids, now)
+
+    def evaluate(self, ids=None, now=None):
+        """Re-filter the given nation IDs (None for all) and emit the differences."""
+        now = time.time() if now is None else now
+        if ids is None:
+            # Only nations inside the range queries can match, the rest are removals at most
+            index = NationIndex(self.nations.values())
+            candidates = index.candidates(self.my_nation, min_infra=self.args.min_infra, max_infra=self.args.max_infra,
+                                          min_inactive_days=self.args.inactive_time, now=now)
+            ids = {n.id for n in candidates} | set(self.targets)
+        else:
+            candidates = [self.nations[i] for i in ids if i in self.nations]
+
+        matches = {t["id"]: t for t in self.filter_nations(candidates, self.my_nation, self.protected)}
+        stamp = datetime.fromtimestamp(now, timezone.utc).isoformat()
+
+        events = []
+        for nation_id in ids:
+            if nation_id in matches:
+                if nation_id not in self.targets:
+                    events.append({"event": "add", "time": stamp, "target": matches[nation_id]})
+                self.targets[nation_id] = matches[nation_id]
+            elif nation_id in self.targets:
+                events.append({"event": "remove", "time": stamp, "target": self.targets.pop(nation_id)})
+
+        for event in events:
+            self.emit(event)
+        return events
+
+def post_webhook(url, events):
+    """POST a batch of watch events as a JSON list. Failures are logged, not raised."""
+    try:
+        response = get_session().post(url, json=events, timeout=10)
+        response.raise_for_status()
+    except Exception as e:
+        print(f"❌ Webhook {url} failed: {str(e)}", file=sys.stderr)
+
+def run_watch(api_key, args, load_my_nation, load_protected, filter_nations, out=sys.stdout):
+    """
+    Run the watch loop until interrupted.
+
+    Events are written to `out` as NDJSON, one object per line. Progress
+    output from fetching and filtering goes to stderr so stdout stays
+    machine-readable. With args.webhook set, each refresh's events are
+    also POSTed there.
+    """
+    def emit(event):
+        out.write(json.dumps(event) + "\n")
+        out.flush()
+
+    watcher = TargetWatcher(api_key, args, load_my_nation, load_protected, filter_nations, emit)
+    interval = getattr(args, "watch_interval", WATCH_INTERVAL)
+    webhook = getattr(args, "webhook", None)
+
+    print(f"Watching for targets (refresh every {interval}s and {WATCH_TURN_DELAY}s after each turn, Ctrl+C to stop)...",
+          file=sys.stderr)
+    try:
+        while True:
+            try:
+                with contextlib.redirect_stdout(sys.stderr):
+                    events = watcher.refresh()
+                print(f"{len(watcher.targets)} target(s), {len(events)} change(s)", file=sys.stderr)
+                if webhook and events:
+                    post_webhook(webhook, events)
+            except Exception as e:
+                # Keep watching through API errors and dropped connections
+                print(f"❌ Refresh failed: {str(e)}", file=sys.stderr)
+
+            now = time.time()
+            time.sleep(max(0, next_refresh(now, interval) - now))
+    except KeyboardInterrupt:
+        print("Stopped watching", file=sys.stderr)